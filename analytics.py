@@ -0,0 +1,175 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Years projected past the last observed year, and the smoothing factor of the exponential
+# smoothing forecast (closer to 1 follows recent years more closely)
+FORECAST_YEARS = int(os.environ.get("NSF_FORECAST_YEARS", "3"))
+SMOOTHING_ALPHA = float(os.environ.get("NSF_SMOOTHING_ALPHA", "0.5"))
+
+TREND_METHODS = ["Linear", "Log-linear", "Exponential smoothing"]
+
+
+# Least-squares line through every series at once. values is (..., years) with NaN for missing
+# years; each series is fitted on its own observed years through the closed-form normal
+# equations, so thousands of series cost a few array operations instead of a Python loop.
+# Returns (intercept, slope, r2), each shaped like values without the last axis; series with
+# fewer than two observations are NaN.
+def fit_lines(values, t):
+    observed = ~np.isnan(values)
+    y = np.where(observed, values, 0).astype(np.float64)
+    w = observed.astype(np.float64)
+    n = w.sum(axis=-1)
+    st = (w * t).sum(axis=-1)
+    stt = (w * t * t).sum(axis=-1)
+    sy = y.sum(axis=-1)
+    sty = (y * t).sum(axis=-1)
+    syy = (y * y).sum(axis=-1)
+
+    with np.errstate(all='ignore'):
+        denominator = n * stt - st * st
+        slope = (n * sty - st * sy) / denominator
+        intercept = (sy - slope * st) / n
+        total = syy - sy * sy / n
+        residual = syy - intercept * sy - slope * sty
+        r2 = np.where(total > 0, 1 - residual / total, np.nan)
+    invalid = (n < 2) | (denominator == 0)
+    for array in (slope, intercept, r2):
+        array[invalid] = np.nan
+    return intercept, slope, r2
+
+
+# Compound annual growth rate between the first and last positive value of every series
+def compound_growth(values, t):
+    positive = ~np.isnan(values) & (values > 0)
+    has_two = positive.sum(axis=-1) >= 2
+    first = np.argmax(positive, axis=-1)
+    last = values.shape[-1] - 1 - np.argmax(positive[..., ::-1], axis=-1)
+    first_value = np.take_along_axis(values, first[..., None], axis=-1)[..., 0]
+    last_value = np.take_along_axis(values, last[..., None], axis=-1)[..., 0]
+    with np.errstate(all='ignore'):
+        cagr = (last_value / first_value) ** (1 / (t[last] - t[first])) - 1
+    return np.where(has_two, cagr, np.nan)
+
+
+# Simple exponential smoothing of every series: the level after each year, carried over
+# missing years. Loops over years only, every series is updated in the same step.
+def exponential_smoothing(values, alpha=SMOOTHING_ALPHA):
+    levels = np.full(values.shape, np.nan, dtype=np.float64)
+    level = np.full(values.shape[:-1], np.nan, dtype=np.float64)
+    for position in range(values.shape[-1]):
+        current = values[..., position]
+        observed = ~np.isnan(current)
+        level = np.where(observed & np.isnan(level), current, level)
+        level = np.where(observed, alpha * current + (1 - alpha) * level, level)
+        levels[..., position] = level
+    return levels
+
+
+# Trend statistics and forecasts of every (university, category) series of a SheetCube
+class SeriesAnalytics:
+    def __init__(self, cube, horizon=FORECAST_YEARS, alpha=SMOOTHING_ALPHA):
+        self.universities = cube.universities
+        self.categories = cube.categories
+        self.years = np.asarray(cube.years, dtype=np.float64)
+        self.horizon = horizon
+        self._university_positions = {name: i for i, name in enumerate(self.universities)}
+        self._category_positions = {name: i for i, name in enumerate(self.categories)}
+
+        values = cube.values.astype(np.float64)
+        t = self.years - self.years[0] if len(self.years) else self.years
+        self._t = t
+        self.observations = (~np.isnan(values)).sum(axis=-1)
+        self.intercept, self.slope, self.r2 = fit_lines(values, t)
+        with np.errstate(all='ignore'):
+            logs = np.where(values > 0, np.log(values), np.nan)
+        self.log_intercept, self.log_slope, self.log_r2 = fit_lines(logs, t)
+        self.cagr = compound_growth(values, t)
+        self.levels = exponential_smoothing(values, alpha)
+
+        # Forecast of every series for the year after the last observed one, by method
+        self.forecasts = {}
+        if len(self.years) and horizon:
+            next_year = np.array([self.years[-1] - self.years[0] + 1])
+            everything = (slice(None), slice(None))
+            self.forecasts = {method: self._project(method, everything, next_year)[..., 0] for method in TREND_METHODS}
+
+    # Observed years followed by the forecast horizon
+    def projection_years(self):
+        if not len(self.years):
+            return np.array([], dtype=int)
+        return np.arange(self.years[0], self.years[-1] + self.horizon + 1).astype(int)
+
+    # Values of the series selected by `where` (an index into universities x categories) at
+    # years t, counted from the first observed year
+    def _project(self, method, where, t):
+        with np.errstate(all='ignore'):
+            if method == "Linear":
+                # Counts can't go below zero
+                return np.maximum(self.intercept[where][..., None] + self.slope[where][..., None] * t, 0)
+            if method == "Log-linear":
+                return np.exp(self.log_intercept[where][..., None] + self.log_slope[where][..., None] * t)
+        if method == "Exponential smoothing":
+            # Smoothed level on the observed years, then flat at the last level
+            levels = self.levels[where]
+            observed = self._t
+            grid = np.full(levels.shape[:-1] + (len(t),), np.nan)
+            if not len(observed):
+                return grid
+            positions = np.minimum(np.searchsorted(observed, t), len(observed) - 1)
+            matched = observed[positions] == t
+            grid[..., matched] = levels[..., positions[matched]]
+            grid[..., t > observed[-1]] = levels[..., -1][..., None]
+            return grid
+        raise ValueError(f"Unknown trend method '{method}', expected one of {TREND_METHODS}")
+
+    # Fitted values over projection_years() for every series: universities x categories x years
+    def fitted(self, method):
+        t = (self.projection_years() - self.years[0]).astype(np.float64) if len(self.years) else self._t
+        return self._project(method, (slice(None), slice(None)), t)
+
+    # Positions of the (university, category) pairs that exist, in the order given
+    def _pairs(self, universities, categories):
+        return [(university, category, self._university_positions[university], self._category_positions[category])
+                for university in universities for category in categories
+                if university in self._university_positions and category in self._category_positions]
+
+    # Long-format fitted values of the given series, for drawing next to the observed rows.
+    # Only those series are projected.
+    def fitted_rows(self, method, universities, categories):
+        pairs = self._pairs(universities, categories)
+        if not pairs or not len(self.years):
+            return pd.DataFrame()
+        years = self.projection_years()
+        where = (np.array([pair[2] for pair in pairs]), np.array([pair[3] for pair in pairs]))
+        fitted = self._project(method, where, (years - self.years[0]).astype(np.float64))
+        frames = []
+        for (university, category, _, _), series in zip(pairs, fitted):
+            if np.isnan(series).all():
+                continue
+            frames.append(pd.DataFrame({'Category': category, 'Year': years, 'Value': series, 'University': university}))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    # Growth statistics and next-year forecasts of the given series, universities shown
+    # through display_name
+    def table(self, universities, categories, display_name=str.title):
+        rows = []
+        for university, category, u, c in self._pairs(universities, categories):
+            if self.observations[u, c] == 0:
+                continue
+            rows.append({
+                'University': display_name(university),
+                'Category': category,
+                'Years observed': int(self.observations[u, c]),
+                'Slope per year': self.slope[u, c],
+                'Trend R²': self.r2[u, c],
+                'Annual growth %': (np.exp(self.log_slope[u, c]) - 1) * 100,
+                'CAGR %': self.cagr[u, c] * 100,
+                **{f"{int(self.years[-1]) + 1} ({method.lower()})": self.forecasts[method][u, c] for method in self.forecasts},
+            })
+        return pd.DataFrame(rows)
+
+
+def build_analytics(cube, horizon=FORECAST_YEARS, alpha=SMOOTHING_ALPHA):
+    return SeriesAnalytics(cube, horizon, alpha)
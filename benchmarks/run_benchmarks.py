@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import json
+import os
+import runpy
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+
+# Make the repository root importable when run as `python benchmarks/run_benchmarks.py`
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+import ingest
+import synthetic
+import utils
+from similarity import SimilarityIndex, similarity_features
+
+# Sheets loaded by the dashboard
+SHEETS = ["Graduate Students", "Source", "Postdoctorates"]
+
+
+# Best and median wall time of `repeat` calls of fn; setup runs untimed before each call
+def measure(fn, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+# Streamlit widgets answer with their defaults and draw nothing
+@contextlib.contextmanager
+def stubbed_streamlit():
+    def multiselect(label, options, default=None, **kwargs):
+        return list(default or [])
+
+    with mock.patch.object(utils.st, "multiselect", side_effect=multiselect), \
+            mock.patch.object(utils.st, "button", return_value=False), \
+            mock.patch.object(utils.st, "write"), \
+            mock.patch.object(utils.st, "plotly_chart"):
+        yield
+
+
+def clear_cache():
+    shutil.rmtree(ingest.CACHE_DIR, ignore_errors=True)
+
+
+# Drop built figures and this session's cached query results
+def clear_figures():
+    utils._figure_cache.clear()
+    utils.session_query_cache().clear()
+
+
+def run_scale(count, repeat, run_scripts):
+    results = []
+
+    def record(name, fn, setup=None, times=repeat):
+        try:
+            best, median = measure(fn, times, setup)
+            results.append({"universities": count, "benchmark": name, "best_s": round(best, 4), "median_s": round(median, 4)})
+        except Exception as e:
+            results.append({"universities": count, "benchmark": name, "error": str(e)})
+        print(json.dumps(results[-1]))
+
+    # Load: cold parses every workbook, warm only stats them and memory-maps the cache
+    for sheet_name in SHEETS:
+        record(f"load[{sheet_name}] cold", lambda: ingest.load_sheet(sheet_name), setup=clear_cache, times=1)
+        record(f"load[{sheet_name}] warm", lambda: utils.load_and_concatenate_data(sheet_name), setup=utils.get_dataset.clear)
+
+    dataset = utils.load_dataset(SHEETS)
+    for sheet_name in SHEETS:
+        data = dataset.frames[sheet_name]
+        record(f"build_hierarchy_by_positions[{sheet_name}]",
+               lambda: utils.build_hierarchy_by_positions(data, ingest.MACRO_CATEGORIES[sheet_name]))
+
+    registry = dataset.registry()
+    record("registry search", lambda: registry.search("state u"))
+    record("similarity index", lambda: SimilarityIndex(*similarity_features({name: dataset.cube(name) for name in SHEETS}, ingest.SIMILARITY_FEATURES)))
+    similarity = SimilarityIndex(*similarity_features({name: dataset.cube(name) for name in SHEETS}, ingest.SIMILARITY_FEATURES))
+    record("nearest peers", lambda: similarity.nearest(similarity.universities[0]) if similarity.universities else [])
+
+    # Filter and figure construction, with and without the figure cache
+    with stubbed_streamlit():
+        for sheet_name in SHEETS:
+            index = dataset.indexes[sheet_name]
+            macro = ingest.MACRO_CATEGORIES[sheet_name][1]
+            subcategories = dataset.hierarchies[sheet_name].get(macro, [])[:4]
+            universities = index.universities()
+            comparison = universities[-1] if universities else ""
+
+            record(f"plot_macro_level[{sheet_name}]", lambda: utils.plot_macro_level(macro, index, sheet_name, registry=registry),
+                   setup=clear_figures)
+            record(f"plot_macro_level[{sheet_name}] cached", lambda: utils.plot_macro_level(macro, index, sheet_name, registry=registry))
+            record(f"plot_micro_level[{sheet_name}]",
+                   lambda: utils.plot_micro_level_multiple_subcategories(macro, universities[0], comparison, index, sheet_name, subcategories,
+                                                                         registry=registry),
+                   setup=clear_figures)
+
+    # The matplotlib scripts write into pictures/ under the benchmark directory
+    if run_scripts:
+        for script, script_args in [("individual_plot.py", []), ("global_plot.py", []), ("render_reports.py", ["--force"])]:
+            path = os.path.join(REPO_ROOT, "code", script)
+            with mock.patch.object(sys, "argv", [path] + script_args):
+                record(f"code/{script}", lambda: runpy.run_path(path, run_name="__main__"), times=1)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the load -> transform -> render pipeline on synthetic workbooks.")
+    parser.add_argument("--universities", type=int, nargs="+", default=[10, 100], help="corpus sizes to benchmark")
+    parser.add_argument("--depth", type=int, default=1, help="levels of subcategories below each macro category")
+    parser.add_argument("--breadth", type=int, default=8, help="subcategories per category and level")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--scripts-max-universities", type=int, default=50,
+                        help="only run the matplotlib scripts for corpus sizes up to this")
+    parser.add_argument("--output", help="write all results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for count in args.universities:
+        with tempfile.TemporaryDirectory() as workdir:
+            # Relative paths (data/, .cache/, pictures/) resolve inside the benchmark directory
+            previous_dir = os.getcwd()
+            os.chdir(workdir)
+            try:
+                print(f"Generating {count} synthetic workbooks...")
+                synthetic.generate(ingest.DATA_DIR, count, depth=args.depth, breadth=args.breadth, workers=ingest.default_workers())
+                utils.get_dataset.clear()
+                results += run_scale(count, args.repeat, count <= args.scripts_max_universities)
+            finally:
+                os.chdir(previous_dir)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import glob
-import matplotlib.cm as cm
+from matplotlib import colormaps
 import numpy as np
+import sys
+
+# Make the repository root importable when run as `python code/global_plot.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import FOCAL_INSTITUTION, load_sheets, to_wide, university_name_from_path
 
 # Get all Excel files in the 'data' directory
 file_paths = glob.glob("data/*.xlsx")
@@ -24,7 +28,7 @@ y_axis_labels = {
     "Postdoctorates": "Total of postdoctorates"
 }
 
-# Define Monarch Blue color for "Old Dominion U"
+# Define Monarch Blue color for the focal institution (NSF_FOCAL_INSTITUTION, Old Dominion U by default)
 monarch_blue = "#003057"
 
 # Directory to save the plots
@@ -34,32 +38,30 @@ os.makedirs(output_dir, exist_ok=True)  # Create directory if it doesn't exist
 # Set a consistent style for the plots
 plt.style.use('ggplot')  # Use a built-in style
 
+# Load every sheet in one pass over the workbooks
+all_data = load_sheets(list(sheets_to_plot))
+
 # Loop through each sheet to generate combined plots
 for sheet_name, columns in sheets_to_plot.items():
     plt.figure(figsize=(12, 8))  # Set a consistent figure size for each sheet
     
     # Generate unique colors for each university
     num_universities = len(file_paths)
-    colors = cm.get_cmap("tab20", num_universities)  # Using 'tab20' colormap for distinct colors
+    colors = colormaps["tab20"].resampled(max(num_universities, 1))  # Using 'tab20' colormap for distinct colors
     
     for idx, file_path in enumerate(file_paths):
         # Extract the filename without extension and format the university name
         file_name = os.path.splitext(os.path.basename(file_path))[0]
         university_name = file_name.replace('-', ' ')
 
-        # Load the Excel file
-        excel_data = pd.ExcelFile(file_path)
+        sheet_data = all_data[sheet_name]
+        if not sheet_data.empty:
+            sheet_data = sheet_data[sheet_data['University'] == university_name_from_path(file_path)]
 
         # Check if the sheet exists in the file
-        if sheet_name in excel_data.sheet_names:
-            # Load the data from the sheet, setting the first column as the index
-            data = pd.read_excel(excel_data, sheet_name=sheet_name, index_col=0)
-
-            # Transpose the data so that years are on the x-axis
-            data = data.transpose()
-
-            # Clean up column names by stripping whitespace
-            data.columns = data.columns.str.strip()
+        if not sheet_data.empty:
+            # One row per year and one column per (whitespace-stripped) category
+            data = to_wide(sheet_data)
 
             # Prepare data to plot based on the specific column(s)
             if sheet_name == "Postdoctorates":
@@ -80,8 +82,8 @@ for sheet_name, columns in sheets_to_plot.items():
                     continue
 
             # Plot each university with a unique color
-            if university_name == "Old Dominion U":
-                # Use strong line with Monarch Blue color for "Old Dominion U"
+            if university_name.lower() == FOCAL_INSTITUTION:
+                # Use strong line with Monarch Blue color for the focal institution
                 data_to_plot.plot(
                     label=university_name,
                     color=monarch_blue,
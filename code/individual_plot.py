@@ -1,7 +1,11 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import glob
+import sys
+
+# Make the repository root importable when run as `python code/individual_plot.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import load_sheets, to_wide, university_name_from_path
 
 # Get all Excel files in the 'data' directory
 file_paths = glob.glob("data/*.xlsx")
@@ -29,27 +33,25 @@ os.makedirs(output_dir, exist_ok=True)  # Create directory if it doesn't exist
 # Set a consistent style for the plots
 plt.style.use('ggplot')  # Use a built-in style
 
+# Load every sheet in one pass over the workbooks
+all_data = load_sheets(list(sheets_to_plot))
+
 # Loop through each Excel file in the 'data' directory
 for file_path in file_paths:
     # Extract the filename without extension and format the university name
     file_name = os.path.splitext(os.path.basename(file_path))[0]
     university_name = file_name.replace('-', ' ')
 
-    # Load the Excel file
-    excel_data = pd.ExcelFile(file_path)
-
     # Loop through each sheet and specified entries in the first column
     for sheet_name, entries in sheets_to_plot.items():
-        # Check if the sheet exists in the file
-        if sheet_name in excel_data.sheet_names:
-            # Load the data from the sheet, setting the first column as the index
-            data = pd.read_excel(excel_data, sheet_name=sheet_name, index_col=0)
-
-            # Transpose the data so that years are on the x-axis
-            data = data.transpose()
+        sheet_data = all_data[sheet_name]
+        if not sheet_data.empty:
+            sheet_data = sheet_data[sheet_data['University'] == university_name_from_path(file_path)]
 
-            # Clean up column names in the DataFrame by stripping whitespace
-            data.columns = data.columns.str.strip()
+        # Check if the sheet exists in the file
+        if not sheet_data.empty:
+            # One row per year and one column per (whitespace-stripped) category
+            data = to_wide(sheet_data)
 
             # Filter only existing columns to avoid KeyError
             available_entries = [entry for entry in entries if entry in data.columns]
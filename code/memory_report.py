@@ -0,0 +1,17 @@
+import os
+import sys
+
+# Make the repository root importable when run as `python code/memory_report.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import load_sheets, memory_report
+
+# Sheets shown in the dashboard
+sheet_names = ["Graduate Students", "Source", "Postdoctorates"]
+
+# Compare the compact long-format layout with the original object-dtype one
+report = memory_report(load_sheets(sheet_names))
+print(report.to_string(index=False))
+
+legacy_total = report['Legacy bytes'].sum()
+compact_total = report['Compact bytes'].sum()
+print(f"\nTotal: {legacy_total:,} bytes -> {compact_total:,} bytes ({legacy_total / compact_total:.1f}x smaller)")
@@ -0,0 +1,233 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib import colormaps, style
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Make the repository root importable when run as `python code/render_reports.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import DATA_DIR, FOCAL_INSTITUTION, default_workers, load_sheets, to_wide, university_name_from_path
+
+# Entries of the first column plotted per university (see individual_plot.py)
+individual_sheets = {
+    "Earned Doctorates": ["Science", "Engineering", "Non-science and engineering"],
+    "Graduate Students": ["Science", "Engineering", "Health"],
+    "Source": ["Fellowships", "Research assistantships", "Teaching assistantships", "Other types of support", "Personal resources"],
+    "Postdoctorates": ["Science", "Engineering", "Health"]
+}
+
+# Entries compared across universities (see global_plot.py)
+global_sheets = {
+    "Earned Doctorates": ["All fields"],
+    "Graduate Students": ["All students"],
+    "Source": ["All types and sources of support"],
+    "Postdoctorates": ["Science", "Engineering", "Health"]  # Sum these for total postdoctorates
+}
+
+# Define custom y-axis labels for each sheet
+y_axis_labels = {
+    "Earned Doctorates": "Total of earned doctorates",
+    "Graduate Students": "Total of full and part-time students",
+    "Source": "Full-time grad students with federal support",
+    "Postdoctorates": "Total of postdoctorates"
+}
+
+# Define Monarch Blue color for the focal institution (NSF_FOCAL_INSTITUTION, Old Dominion U by default)
+monarch_blue = "#003057"
+
+# Directory to save the plots, and the record of what each figure was drawn from
+output_dir = 'pictures'
+render_manifest_path = os.path.join(output_dir, ".render-manifest.json")
+
+# Bump when the look of the figures changes so every figure is redrawn
+RENDER_VERSION = 1
+
+
+# One job per university and sheet: the selected entries of that university's sheet
+def individual_jobs(all_data, file_paths):
+    jobs = []
+    for file_path in file_paths:
+        file_name = os.path.splitext(os.path.basename(file_path))[0]
+        university_name = file_name.replace('-', ' ')
+        for sheet_name, entries in individual_sheets.items():
+            sheet_data = all_data[sheet_name]
+            if not sheet_data.empty:
+                sheet_data = sheet_data[sheet_data['University'] == university_name_from_path(file_path)]
+            if sheet_data.empty:
+                print(f"Sheet '{sheet_name}' not found in file '{file_name}'.")
+                continue
+
+            data = to_wide(sheet_data)
+            available_entries = [entry for entry in entries if entry in data.columns]
+            if not available_entries:
+                print(f"No matching columns found for '{sheet_name}' in '{file_name}'. Skipping plot.")
+                continue
+
+            jobs.append({
+                'kind': 'individual',
+                'path': os.path.join(output_dir, f"{file_name}_{sheet_name.replace(' ', '-')}.png"),
+                'title': f"{university_name} - {sheet_name}",
+                'y_label': y_axis_labels.get(sheet_name, "Values"),
+                'series': [(entry, data[entry]) for entry in available_entries],
+            })
+    return jobs
+
+
+# One job per sheet: the headline entry of every university on the same axes
+def global_jobs(all_data, file_paths):
+    jobs = []
+    for sheet_name, columns in global_sheets.items():
+        series = []
+        for idx, file_path in enumerate(file_paths):
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            university_name = file_name.replace('-', ' ')
+            sheet_data = all_data[sheet_name]
+            if not sheet_data.empty:
+                sheet_data = sheet_data[sheet_data['University'] == university_name_from_path(file_path)]
+            if sheet_data.empty:
+                continue
+
+            data = to_wide(sheet_data)
+            if sheet_name == "Postdoctorates":
+                # Sum columns for "Postdoctorates"
+                if not all(col in data.columns for col in columns):
+                    print(f"Columns for total postdoctorates not found in '{file_name}'. Skipping.")
+                    continue
+                series.append((university_name, idx, data[columns].sum(axis=1)))
+            else:
+                if columns[0] not in data.columns:
+                    print(f"Column '{columns[0]}' not found in '{sheet_name}' for '{file_name}'. Skipping.")
+                    continue
+                series.append((university_name, idx, data[columns[0]]))
+
+        jobs.append({
+            'kind': 'global',
+            'path': os.path.join(output_dir, f"Global-Comparison_{sheet_name.replace(' ', '_')}.png"),
+            'title': f"Global Comparison - {sheet_name}",
+            'y_label': y_axis_labels.get(sheet_name, "Values"),
+            'series': series,
+            'num_universities': len(file_paths),
+        })
+    return jobs
+
+
+# Hash of everything that ends up in a figure, used to skip figures that would come out the same
+def job_hash(job):
+    content = [RENDER_VERSION, job['kind'], job['title'], job['y_label'], job.get('num_universities'), FOCAL_INSTITUTION]
+    for entry in job['series']:
+        content.append([str(part) for part in entry[:-1]] + [entry[-1].to_json()])
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
+def _finish(fig, ax, job, legend_title):
+    ax.set_title(job['title'], fontsize=16, fontweight='bold')
+    ax.set_xlabel("Year", fontsize=12)
+    ax.set_ylabel(job['y_label'], fontsize=12)
+    ax.tick_params(labelsize=10)
+
+    # Customize the legend to be on the right side, outside the plot area
+    ax.legend(title=legend_title, loc="center left", bbox_to_anchor=(1.05, 0.5), fontsize=10, title_fontsize=12, frameon=True, shadow=True)
+
+    # Enable grid for better readability
+    ax.grid(True, linestyle='--', linewidth=0.5)
+
+    FigureCanvasAgg(fig)
+    fig.savefig(job['path'], dpi=300, bbox_inches='tight')  # Save with high resolution
+
+
+# Draw one figure with the object-oriented Agg API, without touching pyplot's global state
+def render(job):
+    with style.context('ggplot'):
+        fig = Figure(figsize=(12, 8))
+        ax = fig.subplots()
+        if job['kind'] == 'individual':
+            for label, values in job['series']:
+                ax.plot(values.index, values.values, linewidth=2, label=label)
+            _finish(fig, ax, job, "Categories")
+        else:
+            colors = colormaps["tab20"].resampled(max(job['num_universities'], 1))
+            for university_name, idx, values in job['series']:
+                if university_name.lower() == FOCAL_INSTITUTION:
+                    ax.plot(values.index, values.values, label=university_name, color=monarch_blue, linestyle='-', linewidth=2.5)
+                else:
+                    ax.plot(values.index, values.values, label=university_name, color=colors(idx), linestyle='--', linewidth=1.5)
+            _finish(fig, ax, job, "University")
+    return job['path']
+
+
+# Pool entry point: report failures instead of raising so the other figures still get drawn
+def _render_worker(job):
+    try:
+        return render(job), None
+    except Exception as e:
+        return job['path'], str(e)
+
+
+def load_render_manifest():
+    try:
+        with open(render_manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_render_manifest(manifest):
+    tmp_path = f"{render_manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, render_manifest_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the PNG reports in pictures/ from the shared loader.")
+    parser.add_argument("--only", choices=["individual", "global"], help="render only one kind of figure")
+    parser.add_argument("--workers", type=int, default=None, help="number of render processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="redraw figures even if their data did not change")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory holding the source workbooks")
+    args = parser.parse_args(argv)
+
+    os.makedirs(output_dir, exist_ok=True)  # Create directory if it doesn't exist
+
+    # Load every sheet once, for every figure
+    file_paths = sorted(glob.glob(os.path.join(args.data_dir, "*.xlsx")))
+    all_data = load_sheets(sorted(set(individual_sheets) | set(global_sheets)), args.data_dir)
+
+    jobs = []
+    if args.only in (None, "individual"):
+        jobs += individual_jobs(all_data, file_paths)
+    if args.only in (None, "global"):
+        jobs += global_jobs(all_data, file_paths)
+
+    manifest = load_render_manifest()
+    hashes = {job['path']: job_hash(job) for job in jobs}
+    pending = [
+        job for job in jobs
+        if args.force or manifest.get(job['path']) != hashes[job['path']] or not os.path.exists(job['path'])
+    ]
+
+    workers = default_workers() if args.workers is None else args.workers
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            results = list(pool.map(_render_worker, pending))
+    else:
+        results = [_render_worker(job) for job in pending]
+
+    for path, error in results:
+        if error is not None:
+            print(f"Failed to render {path}: {error}")
+            manifest.pop(path, None)
+        else:
+            manifest[path] = hashes[path]
+    save_render_manifest(manifest)
+
+    print(f"Rendered {len(pending)} of {len(jobs)} figures ({len(jobs) - len(pending)} unchanged).")
+
+
+if __name__ == "__main__":
+    main()
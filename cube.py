@@ -0,0 +1,191 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from sheet_index import SheetIndex
+
+# Columns of the peer statistics frame besides Category, Year and Count
+PEER_STATISTICS = ['Mean', 'Min', 'Q1', 'Median', 'Q3', 'Max']
+
+
+# Dense universities x categories x years view of one sheet. Missing cells are NaN.
+# Categories that appear more than once in a sheet (e.g. "Federal" under each type of
+# support in Source) are summed into a single cell.
+class SheetCube:
+    def __init__(self, values, universities, categories, years):
+        self.values = values
+        self.universities = list(universities)
+        self.categories = list(categories)
+        self.years = list(years)
+        self._university_positions = {name: i for i, name in enumerate(self.universities)}
+        self._category_positions = {name: i for i, name in enumerate(self.categories)}
+
+    def university_position(self, university):
+        return self._university_positions[university]
+
+    def category_position(self, category):
+        return self._category_positions[category]
+
+    # Universities other than `exclude`, as a boolean mask over the first axis
+    def _peers(self, exclude=None):
+        mask = np.ones(len(self.universities), dtype=bool)
+        if exclude is not None:
+            mask[self.university_position(exclude)] = False
+        return mask
+
+    # Sum over universities: categories x years
+    def totals(self):
+        return np.where(np.isnan(self.values).all(axis=0), np.nan, np.nansum(self.values, axis=0))
+
+    # Median over universities, optionally leaving one out: categories x years
+    def peer_median(self, exclude=None):
+        # Cells without any peer value come back NaN; silence numpy's all-NaN warning for them
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanmedian(self.values[self._peers(exclude)], axis=0)
+
+    # University value minus the median of every other university: categories x years
+    def gap(self, university):
+        return self.values[self.university_position(university)] - self.peer_median(exclude=university)
+
+    # 1 for the largest value in each (category, year) cell, NaN where a university has no value.
+    # Tied values share the best rank of their group (competition ranking: 1 plus the number of
+    # strictly greater values), so an all-zero cell ranks everyone 1.
+    def ranks(self):
+        filled = np.where(np.isnan(self.values), -np.inf, self.values)
+        order = np.argsort(-filled, axis=0, kind='stable')
+        ordered = np.take_along_axis(filled, order, axis=0)
+        positions = np.arange(1, len(self.universities) + 1, dtype=np.float32)[:, None, None]
+        starts = np.ones(ordered.shape, dtype=bool)
+        starts[1:] = ordered[1:] != ordered[:-1]
+        ordered_ranks = np.maximum.accumulate(np.where(starts, positions, 0), axis=0)
+        ranks = np.empty(self.values.shape, dtype=np.float32)
+        np.put_along_axis(ranks, order, ordered_ranks, axis=0)
+        ranks[np.isnan(self.values)] = np.nan
+        return ranks
+
+    # Distribution over universities other than `exclude` in every (category, year) cell:
+    # {statistic: categories x years array}. Cells without any peer value are NaN.
+    def peer_stats(self, exclude=None):
+        peers = self.values[self._peers(exclude)]
+        count = (~np.isnan(peers)).sum(axis=0)
+        if len(peers) == 0:
+            empty = np.full(self.values.shape[1:], np.nan, dtype=np.float32)
+            return {'Count': count, **{name: empty for name in PEER_STATISTICS}}
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            minimum, q1, median, q3, maximum = np.nanpercentile(peers, [0, 25, 50, 75, 100], axis=0)
+            mean = np.nanmean(peers, axis=0)
+        return {'Count': count, 'Mean': mean, 'Min': minimum, 'Q1': q1, 'Median': median, 'Q3': q3, 'Max': maximum}
+
+    # Percentile of each university's rank among the universities with a value in the cell,
+    # from 0 (last) to 100 (first); tied universities share it, and a university alone in its
+    # cell is at 100
+    def percentiles(self):
+        ranks = self.ranks()
+        counts = (~np.isnan(self.values)).sum(axis=0)
+        with np.errstate(all='ignore'):
+            percentiles = (counts - ranks) / (counts - 1) * 100
+        percentiles[:, counts == 1] = 100
+        percentiles[np.isnan(self.values)] = np.nan
+        return percentiles.astype(np.float32)
+
+    # Relative change from the previous year; the first year has no growth and is NaN
+    def yoy_growth(self):
+        growth = np.full(self.values.shape, np.nan, dtype=np.float32)
+        with np.errstate(all='ignore'):
+            growth[..., 1:] = (self.values[..., 1:] - self.values[..., :-1]) / self.values[..., :-1]
+        growth[~np.isfinite(growth)] = np.nan
+        return growth
+
+    # Label a categories x years array produced by one of the methods above
+    def to_frame(self, array):
+        return pd.DataFrame(array, index=self.categories, columns=self.years)
+
+
+# Build the cube from the long-format frame returned by the loader
+def build_cube(data):
+    if data.empty:
+        return SheetCube(np.empty((0, 0, 0), dtype=np.float32), [], [], [])
+
+    universities = data['University'].cat.categories
+    categories = data['Category'].cat.categories
+    years = np.unique(data['Year'].to_numpy())
+
+    university_codes = data['University'].cat.codes.to_numpy()
+    category_codes = data['Category'].cat.codes.to_numpy()
+    year_codes = np.searchsorted(years, data['Year'].to_numpy())
+    values = data['Value'].to_numpy()
+
+    valid = ~np.isnan(values)
+    cells = (university_codes[valid], category_codes[valid], year_codes[valid])
+    shape = (len(universities), len(categories), len(years))
+    cube = np.zeros(shape, dtype=np.float32)
+    np.add.at(cube, cells, values[valid])
+    filled = np.zeros(shape, dtype=bool)
+    filled[cells] = True
+    cube[~filled] = np.nan
+
+    return SheetCube(cube, universities, categories, years.tolist())
+
+
+# Peer statistics of every (category, year) cell in long format, one row per cell with at
+# least one peer value, sorted by category then year
+def peer_frame(cube, exclude=None):
+    categories, years = len(cube.categories), len(cube.years)
+    stats = cube.peer_stats(exclude)
+    frame = pd.DataFrame({
+        'Category': pd.Categorical.from_codes(np.repeat(np.arange(categories), years), categories=cube.categories),
+        'Year': np.tile(np.asarray(cube.years, dtype='int16'), categories),
+        'Count': stats['Count'].reshape(-1).astype('int32'),
+        **{name: stats[name].reshape(-1).astype('float32') for name in PEER_STATISTICS},
+    })
+    return frame[frame['Count'] > 0].reset_index(drop=True)
+
+
+# Value, rank and percentile of every university in every cell, in SheetIndex order
+# (category, university, year) so it can be indexed without sorting
+def rank_frame(cube):
+    shape = (len(cube.categories), len(cube.universities), len(cube.years))
+    values = np.transpose(cube.values, (1, 0, 2))
+    frame = pd.DataFrame({
+        'Category': pd.Categorical.from_codes(np.repeat(np.arange(shape[0]), shape[1] * shape[2]), categories=cube.categories),
+        'University': pd.Categorical.from_codes(np.tile(np.repeat(np.arange(shape[1]), shape[2]), shape[0]), categories=cube.universities),
+        'Year': np.tile(np.asarray(cube.years, dtype='int16'), shape[0] * shape[1]),
+        'Value': values.reshape(-1),
+        'Rank': np.transpose(cube.ranks(), (1, 0, 2)).reshape(-1),
+        'Percentile': np.transpose(cube.percentiles(), (1, 0, 2)).reshape(-1),
+    })
+    return frame[~np.isnan(frame['Value'].to_numpy())].reset_index(drop=True)
+
+
+# Peer bands and rankings of one sheet for one focal institution, looked up by category
+class PeerAggregates:
+    def __init__(self, peers, ranks, focal, key=None):
+        self.focal = focal
+        self.peers = peers
+        self.ranks = SheetIndex(ranks, key=key, presorted=True)
+        self._bands = {}
+        if not peers.empty:
+            codes = peers['Category'].cat.codes.to_numpy()
+            boundaries = np.flatnonzero(np.diff(codes)) + 1
+            for start, stop in zip(np.r_[0, boundaries].tolist(), np.r_[boundaries, len(peers)].tolist()):
+                self._bands[peers['Category'].cat.categories[codes[start]]] = (start, stop)
+
+    # Peer statistics of one category by year
+    def band(self, category):
+        bounds = self._bands.get(category)
+        return self.peers.iloc[bounds[0]:bounds[1]] if bounds else self.peers.iloc[0:0]
+
+    # Universities x years table of ranks in one category, best first in the latest year
+    def rank_table(self, category):
+        rows = self.ranks.category(category)
+        if rows.empty:
+            return pd.DataFrame()
+        table = rows.pivot_table(index='University', columns='Year', values='Rank', observed=True)
+        return table.sort_values(table.columns[-1], na_position='last')
+
+    # Rank and percentile of the focal institution in one category by year
+    def focal_rows(self, category):
+        return self.ranks.series(category, self.focal)
@@ -0,0 +1,117 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+from pyarrow import parquet
+
+# {format: (file extension, MIME type)}
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# Rows converted and written at a time; memory stays at one batch whatever the export size
+BATCH_ROWS = 65536
+
+# Excel limits worksheet names to 31 characters, some of them forbidden
+_FORBIDDEN_SHEET_CHARACTERS = str.maketrans({character: "-" for character in '[]:*?/\\'})
+
+
+# Record batches of the given row ranges of a table, or of all of it, optionally only the
+# rows whose Year falls in years=(first, last). Slices of a memory-mapped table are views, so
+# nothing is read until a batch is written.
+def table_batches(table, ranges=None, years=None, batch_rows=BATCH_ROWS):
+    pieces = [table] if ranges is None else [table.slice(start, stop - start) for start, stop in ranges]
+    for piece in pieces:
+        for batch in piece.to_batches(max_chunksize=batch_rows):
+            if years is not None:
+                year = batch.column('Year')
+                batch = batch.filter(pc.and_(pc.greater_equal(year, years[0]), pc.less_equal(year, years[1])))
+                if batch.num_rows == 0:
+                    continue
+            yield _missing_as_null(batch)
+
+
+# Values are float NaN when missing; written as null they come out as empty cells
+def _missing_as_null(batch):
+    columns = []
+    for column in batch.columns:
+        if pa.types.is_floating(column.type):
+            column = pc.if_else(pc.is_nan(column), pa.scalar(None, column.type), column)
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def _write_csv(parts, schema, path):
+    with pa_csv.CSVWriter(path, schema) as writer:
+        for _, batches in parts:
+            for batch in batches:
+                writer.write_batch(batch)
+
+
+def _write_parquet(parts, schema, path):
+    with parquet.ParquetWriter(path, schema) as writer:
+        for _, batches in parts:
+            for batch in batches:
+                writer.write_batch(batch)
+
+
+# One worksheet per part, written row by row with openpyxl's write-only mode so the workbook
+# is never held in memory
+def _write_xlsx(parts, schema, path):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    used = set()
+    for name, batches in parts:
+        title = str(name).translate(_FORBIDDEN_SHEET_CHARACTERS)[:31] or "Data"
+        suffix = 2
+        while title.lower() in used:
+            title = f"{title[:28]}-{suffix}"
+            suffix += 1
+        used.add(title.lower())
+
+        worksheet = workbook.create_sheet(title)
+        worksheet.append(schema.names)
+        for batch in batches:
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                worksheet.append(row)
+    workbook.save(path)
+
+
+_WRITERS = {"CSV": _write_csv, "Parquet": _write_parquet, "XLSX": _write_xlsx}
+
+
+# Stream `parts` of a table into path in the given format. parts is a list of
+# (name, row ranges or None for the whole table); CSV and Parquet concatenate them,
+# XLSX gives each its own worksheet. years=(first, last) keeps only those years.
+def write_export(table, parts, fmt, path, years=None):
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {list(_WRITERS)}")
+    schema = table.schema.remove_metadata()
+    streams = [(name, table_batches(table, ranges, years)) for name, ranges in parts]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    _WRITERS[fmt](streams, schema, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+# Export file for a data version and selection, written on first request and reused after
+# that. Exports of older versions are removed.
+def cached_export(export_dir, version, sheet_name, table, parts, fmt, years=None):
+    extension = EXPORT_FORMATS[fmt][0]
+    digest = hashlib.sha256(json.dumps([sheet_name, fmt, parts, years], default=str).encode()).hexdigest()[:16]
+    path = os.path.join(export_dir, version, f"{sheet_name.replace(' ', '-')}-{digest}.{extension}")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for stale in glob.glob(os.path.join(export_dir, "*")):
+            if os.path.basename(stale) != version:
+                shutil.rmtree(stale, ignore_errors=True)
+        write_export(table, parts, fmt, path, years)
+    return path
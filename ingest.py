@@ -0,0 +1,864 @@
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from analytics import build_analytics
+from cube import PeerAggregates, build_cube, peer_frame, rank_frame
+from instrumentation import collect, extend, stage
+from registry import InstitutionRegistry
+import shared_store
+from sheet_index import SheetIndex, index_order
+
+# Location of the source workbooks and of the columnar cache built from them
+DATA_DIR = "data"
+CACHE_DIR = os.path.join(".cache", "columnar")
+MANIFEST_PATH = os.path.join(CACHE_DIR, "manifest.json")
+
+# Sheets of each data version shared by all processes (see shared_store.py).
+# NSF_SHARED_STORE=0 makes every process keep its own copy instead.
+STORE_DIR = os.path.join(CACHE_DIR, "store")
+
+# Bumped whenever the partition layout changes, so older partitions are rebuilt
+SCHEMA_VERSION = 3
+
+# Bumped whenever materialized peer aggregates change meaning, so cached ones are recomputed
+AGGREGATES_VERSION = 2
+
+# Top-level categories of each sheet; the rows between two of them are its subcategories
+MACRO_CATEGORIES = {
+    "Graduate Students": ["All full-time students", "Science", "Engineering", "Health"],
+    "Source": [
+        "All types and sources of support",
+        "Fellowships",
+        "Research assistantships",
+        "Teaching assistantships",
+        "Other types of support",
+        "Personal resources"
+    ],
+    "Postdoctorates": ["Science", "Engineering", "Health"],
+}
+
+# Features of the nearest-peer search (see similarity.py), per sheet: its total category, or
+# None when the parts have none, and the parts whose mix describes an institution
+SIMILARITY_FEATURES = {
+    "Graduate Students": ("All students", ["Science", "Engineering", "Health"]),
+    "Source": ("All types and sources of support", MACRO_CATEGORIES["Source"][1:]),
+    "Postdoctorates": (None, MACRO_CATEGORIES["Postdoctorates"]),
+}
+
+# Institution the dashboard compares against its peers, as a normalized university name
+# (see university_name_from_path). Peer statistics leave it out.
+FOCAL_INSTITUTION = os.environ.get("NSF_FOCAL_INSTITUTION", "Old Dominion U").strip().lower()
+
+# Long-format columns stored dictionary-encoded: their values repeat on almost every row
+CATEGORICAL_COLUMNS = ['Category', 'University']
+
+# Bulk NSF exports (one flat file covering many institutions) placed in the data directory
+# next to the workbooks. They are read in chunks of `chunk_rows` rows and reshaped with the
+# export config, read from <data dir>/exports.json or the file named by NSF_EXPORT_CONFIG.
+EXPORT_EXTENSIONS = (".csv", ".parquet")
+DEFAULT_EXPORT_CONFIG = {
+    # Column of the export holding each long-format field. "sheet" may be null when the
+    # whole export belongs to the sheet named by "sheet_name".
+    "columns": {"university": "inst_name_long", "year": "year", "category": "row", "value": "data", "sheet": "questionnaire_no"},
+    "sheet_name": None,
+    # {value of the sheet column: sheet name}; rows with other values are dropped.
+    # null keeps every value, using it as the sheet name.
+    "sheets": None,
+    # Institutions to keep, matched case-insensitively; empty keeps every institution
+    "peers": [],
+    "chunk_rows": 100000,
+}
+
+
+# University name used across the app, derived from the workbook filename
+def university_name_from_path(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0].replace("-", " ").strip().lower()
+
+
+# Name shown for a workbook's university: the filename with its own capitalization, so
+# "U-Texas-The-San Antonio.xlsx" reads "U Texas The San Antonio"
+def display_name_from_path(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0].replace("-", " ").strip()
+
+
+# Content hash of a workbook, read in chunks so large files don't sit in memory
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable cache manifest {MANIFEST_PATH}: {e}")
+        return {}
+
+
+# (mtime, size) of the manifest file, or None when there is none
+def manifest_stamp():
+    try:
+        stat = os.stat(MANIFEST_PATH)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# Merge this process's manifest changes (`entries` added or updated, `removed` dropped)
+# into the manifest on disk and return the result. Other processes update it too, so it is
+# re-read under an exclusive lock on a sidecar file rather than overwritten with an
+# in-memory copy. Writes go to a temporary file first so a crash never leaves a
+# half-written manifest.
+def save_manifest(entries, removed=()):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(f"{MANIFEST_PATH}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = load_manifest()
+        manifest.update(entries)
+        for file in removed:
+            manifest.pop(file, None)
+        tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, MANIFEST_PATH)
+    return manifest
+
+
+# Workbooks and bulk exports in data_dir, in a stable order
+def source_files(data_dir):
+    patterns = ["*.xlsx"] + [f"*{extension}" for extension in EXPORT_EXTENSIONS]
+    return sorted(file for pattern in patterns for file in glob.glob(os.path.join(data_dir, pattern)))
+
+
+def is_export(file_path):
+    return file_path.lower().endswith(EXPORT_EXTENSIONS)
+
+
+# Export config for data_dir: the defaults overridden by whatever the config file sets
+def load_export_config(data_dir=DATA_DIR):
+    path = os.environ.get("NSF_EXPORT_CONFIG", os.path.join(data_dir, "exports.json"))
+    config = json.loads(json.dumps(DEFAULT_EXPORT_CONFIG))
+    if os.path.exists(path):
+        with open(path) as f:
+            overrides = json.load(f)
+        config["columns"].update(overrides.pop("columns", {}))
+        config.update(overrides)
+    return config
+
+
+# Canonical names, stable IDs and aliases of institutions (see registry.py), read from
+# <data dir>/institutions.json or the file named by NSF_INSTITUTIONS_CONFIG. A list of
+# {"name": ..., "id": ..., "aliases": [...]}; every field but one of the names is optional.
+def load_institutions_config(data_dir=DATA_DIR):
+    path = os.environ.get("NSF_INSTITUTIONS_CONFIG", os.path.join(data_dir, "institutions.json"))
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Failed to process {path}: {e}")
+        return []
+
+
+# Exports are re-ingested when the config that shaped their partitions changes
+def export_config_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+# One directory per workbook, one Arrow file per sheet inside it. The source directory is
+# part of the key so workbooks with the same name in different directories don't collide.
+def partition_dir(file_path):
+    source_dir = os.path.normpath(os.path.dirname(file_path)).replace(os.sep, "_")
+    return os.path.join(CACHE_DIR, source_dir, os.path.splitext(os.path.basename(file_path))[0])
+
+
+def partition_path(file_path, sheet_name):
+    return os.path.join(partition_dir(file_path), f"{sheet_name.replace(' ', '-')}.arrow")
+
+
+# Uncompressed so the loader can memory-map it instead of decoding it. Written to a temporary
+# file first: other processes may be mapping the previous version of the partition.
+def write_partition(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(data, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    return os.path.basename(path)
+
+
+# Partitions of a file's earlier versions that the new one doesn't replace
+def remove_stale_partitions(file_path, sheets):
+    current = {name for name in sheets.values() if name is not None}
+    for stale in glob.glob(os.path.join(partition_dir(file_path), "*.arrow")):
+        if os.path.basename(stale) not in current:
+            os.remove(stale)
+
+
+# Melt a raw sheet (categories in the first column, one column per year) into long format.
+# Row keeps each row's position in the raw sheet, blank rows included, so sheets laid out
+# alike can be matched row by row (see combine_graduate_students).
+def tidy_sheet(data, university_name):
+    if data.empty:
+        return None
+
+    # Ensure the first column is renamed to 'Category'
+    data = data.rename(columns={data.columns[0]: 'Category'})
+
+    data['Category'] = data['Category'].ffill()
+    value_vars = [col for col in data.columns if col != 'Category']
+    data['Row'] = np.arange(len(data), dtype='int32')
+    data = data.dropna(subset=value_vars, how='all')
+    data = data.melt(id_vars=['Category', 'Row'], value_vars=value_vars, var_name='Year', value_name='Value')
+
+    # Compact layout: categorical keys, int16 years and float32 counts
+    data['Year'] = pd.to_numeric(data['Year'], errors='coerce')
+    data = data.dropna(subset=['Year'])
+    data['Year'] = data['Year'].astype('int16')
+    data['Value'] = pd.to_numeric(data['Value'].str.replace(',', ''), errors='coerce').astype('float32')
+    data['Category'] = pd.Categorical(data['Category'], categories=data['Category'].unique())
+    data['University'] = pd.Categorical([university_name] * len(data))
+    return data[['Category', 'Year', 'Value', 'University', 'Row']].reset_index(drop=True)
+
+
+# Map each macro category to the categories listed after it, up to the next macro category.
+# Linear in the number of rows: categorical data already carries its categories in order of
+# first appearance, and positions are looked up in a dict rather than with list.index.
+def build_hierarchy(data, macro_categories):
+    if 'Category' not in data.columns:
+        print("Error: 'Category' column not found in data passed to hierarchy builder.")
+        return {}
+
+    if isinstance(data['Category'].dtype, pd.CategoricalDtype):
+        unique_categories_in_order = data['Category'].cat.categories.tolist()
+    else:
+        unique_categories_in_order = pd.unique(data['Category']).tolist()
+    positions = {}
+    for position, category in enumerate(unique_categories_in_order):
+        positions.setdefault(category, position)
+
+    macro_indices = [positions[macro] for macro in macro_categories if macro in positions]
+    macro_indices.append(len(unique_categories_in_order))
+
+    hierarchy = {}
+    for idx in range(len(macro_indices) - 1):
+        macro_idx = macro_indices[idx]
+        next_macro_idx = macro_indices[idx + 1]
+        hierarchy[unique_categories_in_order[macro_idx]] = unique_categories_in_order[macro_idx + 1:next_macro_idx]
+    return hierarchy
+
+
+# Position of each row in its raw sheet: the Row recorded by tidy_sheet, or for rows without
+# one (bulk exports) the position among the kept rows of its (university, year)
+def raw_row_positions(data):
+    positions = data.groupby(['University', 'Year'], observed=True).cumcount()
+    if 'Row' in data.columns:
+        positions = data['Row'].fillna(positions)
+    return positions.astype('int64')
+
+
+# "Graduate Students" for every university at once: full-time plus part-time counts, matched
+# by raw row position within each (university, year) like the sheets themselves, so a row
+# left blank in only one of the sheets doesn't shift the rows after it. The first row
+# ("All full-time students") becomes "All students".
+def combine_graduate_students(full_time, part_time):
+    if full_time.empty:
+        return full_time
+    keys = ['University', 'Year', 'Row']
+    first = full_time.groupby(['University', 'Year'], observed=True).cumcount() == 0
+    full_time = full_time.assign(University=full_time['University'].astype(str), Row=raw_row_positions(full_time), First=first)
+    part_time = part_time.assign(University=part_time['University'].astype(str), Row=raw_row_positions(part_time))
+    combined = full_time.merge(part_time[keys + ['Value']], on=keys, how='left', suffixes=('', '_part'))
+
+    # Missing part-time counts leave the full-time value unchanged, as DataFrame.add(fill_value=0)
+    values = combined['Value'].add(combined['Value_part'], fill_value=0).astype('float32')
+    categories = combined['Category'].astype(str).where(~combined['First'], 'All students')
+    return pd.DataFrame({
+        'Category': pd.Categorical(categories, categories=categories.unique()),
+        'Year': combined['Year'],
+        'Value': values,
+        'University': pd.Categorical(combined['University']),
+    })
+
+
+# Sheets computed from other sheets instead of being read from the workbooks:
+# {sheet name: (input sheets, function combining their concatenated frames)}
+DERIVED_SHEETS = {
+    "Graduate Students": (["Full-time Graduate Students", "Part-time Graduate Students"], combine_graduate_students),
+}
+
+
+# Concatenate long-format frames, keeping the key columns categorical. pd.concat falls back to
+# object dtype when categories differ, so every frame is first given the union of categories.
+def concat_frames(frames):
+    if not frames:
+        return pd.DataFrame()
+    frames = list(frames)
+    for column in CATEGORICAL_COLUMNS:
+        categories = pd.Index(np.concatenate([frame[column].cat.categories for frame in frames])).unique()
+        frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+# Bytes used by a long-format frame in the compact layout versus the original one
+# (object strings for Category, Year and University, float64 values).
+def memory_report(frames):
+    rows = []
+    for sheet_name, data in frames.items():
+        if data.empty:
+            continue
+        legacy = data.astype({'Category': object, 'University': object, 'Value': 'float64'})
+        legacy['Year'] = legacy['Year'].astype(str)
+        compact_bytes = data.memory_usage(deep=True).sum()
+        legacy_bytes = legacy.memory_usage(deep=True).sum()
+        rows.append({
+            'Sheet': sheet_name,
+            'Rows': len(data),
+            'Legacy bytes': legacy_bytes,
+            'Compact bytes': compact_bytes,
+            'Ratio': round(legacy_bytes / compact_bytes, 1),
+        })
+    return pd.DataFrame(rows)
+
+
+# Parse every sheet of a workbook in a single openpyxl pass and write one partition per sheet.
+# Returns {sheet name: partition file name, or None when the sheet holds no data}.
+def ingest_workbook(file_path):
+    with stage("parse workbook", file=file_path) as record:
+        raw_sheets = pd.read_excel(file_path, sheet_name=None, dtype=str)
+        record["rows"] = sum(len(raw) for raw in raw_sheets.values())
+    university_name = university_name_from_path(file_path)
+
+    sheets = {}
+    for sheet_name, raw in raw_sheets.items():
+        with stage("melt and coerce", file=file_path, sheet=sheet_name) as record:
+            data = tidy_sheet(raw, university_name)
+            record["rows"] = 0 if data is None else len(data)
+        if data is None:
+            sheets[sheet_name] = None
+            continue
+        sheets[sheet_name] = write_partition(data, partition_path(file_path, sheet_name))
+    remove_stale_partitions(file_path, sheets)
+    return sheets
+
+
+# Raw chunks of an export as string columns, only the columns in `columns`, at most
+# chunk_rows rows at a time, so memory is bounded by the chunk size and the kept rows
+def read_export_chunks(file_path, columns, chunk_rows):
+    if file_path.lower().endswith(".parquet"):
+        from pyarrow import parquet
+        for batch in parquet.ParquetFile(file_path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas().astype("string")
+    else:
+        with pd.read_csv(file_path, usecols=columns, dtype=str, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield chunk.astype("string")
+
+
+# Reshape one chunk into the long format, with a Sheet column, keeping only the peers
+def tidy_export_chunk(chunk, config, peers):
+    columns = config["columns"]
+    university = chunk[columns["university"]].str.strip().str.lower()
+    if columns.get("sheet"):
+        sheet = chunk[columns["sheet"]].str.strip()
+        if config.get("sheets"):
+            sheet = sheet.map(config["sheets"]).astype("string")
+    else:
+        sheet = pd.Series(config["sheet_name"], index=chunk.index, dtype="string")
+
+    data = pd.DataFrame({
+        'Category': chunk[columns["category"]].str.strip(),
+        'Year': pd.to_numeric(chunk[columns["year"]], errors='coerce'),
+        'Value': pd.to_numeric(chunk[columns["value"]].str.replace(',', ''), errors='coerce'),
+        'University': university,
+        'Sheet': sheet,
+    })
+    if peers:
+        data = data[data['University'].isin(peers)]
+    data = data.dropna(subset=['Category', 'Year', 'University', 'Sheet'])
+
+    return pd.DataFrame({
+        'Category': data['Category'].to_numpy(dtype=object),
+        'Year': data['Year'].to_numpy(dtype='int16'),
+        'Value': data['Value'].to_numpy(dtype='float32', na_value=np.nan),
+        'University': data['University'].to_numpy(dtype=object),
+        'Sheet': data['Sheet'].to_numpy(dtype=object),
+    })
+
+
+# Stream a bulk export into one partition per sheet, like a workbook's. Only the rows of the
+# configured peers are kept, so memory follows the peer set rather than the national file.
+def ingest_export(file_path, config):
+    columns = [name for name in config["columns"].values() if name]
+    peers = {peer.strip().lower() for peer in config.get("peers") or []}
+    chunk_rows = int(os.environ.get("NSF_EXPORT_CHUNK_ROWS", config.get("chunk_rows") or DEFAULT_EXPORT_CONFIG["chunk_rows"]))
+
+    pieces = {}
+    with stage("stream export", file=file_path) as record:
+        record["rows"] = 0
+        for chunk in read_export_chunks(file_path, columns, chunk_rows):
+            record["rows"] += len(chunk)
+            data = tidy_export_chunk(chunk, config, peers)
+            for sheet_name, rows in data.groupby('Sheet', sort=False):
+                # Same compact layout as tidy_sheet, categories in order of first appearance
+                # (which build_hierarchy relies on)
+                pieces.setdefault(sheet_name, []).append(pd.DataFrame({
+                    'Category': pd.Categorical(rows['Category'], categories=pd.unique(rows['Category'])),
+                    'Year': rows['Year'].to_numpy(),
+                    'Value': rows['Value'].to_numpy(),
+                    'University': pd.Categorical(rows['University'], categories=pd.unique(rows['University'])),
+                }))
+
+    sheets = {}
+    for sheet_name, frames in pieces.items():
+        sheets[sheet_name] = write_partition(concat_frames(frames), partition_path(file_path, sheet_name))
+    remove_stale_partitions(file_path, sheets)
+    return sheets
+
+
+# Check a workbook against its manifest entry. Returns None when its partitions are current,
+# otherwise the (stat, sha256) pair to record once it has been re-ingested.
+# mtime and size are checked first so unchanged files are never hashed.
+def stale_workbook(file_path, manifest, config_hash=None):
+    stat = os.stat(file_path)
+    entry = manifest.get(file_path)
+    partitions_present = entry is not None and "sheets" in entry and all(
+        os.path.exists(os.path.join(partition_dir(file_path), name))
+        for name in entry["sheets"].values() if name is not None
+    )
+    partitions_present = partitions_present and entry.get("schema") == SCHEMA_VERSION
+    partitions_present = partitions_present and entry.get("config") == config_hash
+    if partitions_present and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+        return None
+
+    digest = file_hash(file_path)
+    if partitions_present and entry["sha256"] == digest:
+        # Touched but not modified: keep the partitions, refresh the stat fields
+        entry.update(mtime=stat.st_mtime, size=stat.st_size)
+        return None
+    return stat, digest
+
+
+# Whether a file that failed to ingest is still the version that failed (same stat, or same
+# content after a touch) under the same config, so it isn't parsed and reported again
+def failed_unchanged(file_path, manifest, config_hash=None):
+    entry = manifest.get(file_path)
+    if entry is None or entry.get("error") is None or entry.get("config") != config_hash:
+        return False
+    stat = os.stat(file_path)
+    if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+        return True
+    if entry["sha256"] == file_hash(file_path):
+        entry.update(mtime=stat.st_mtime, size=stat.st_size)
+        return True
+    return False
+
+
+# Pool entry point. Errors are returned rather than raised so one bad workbook
+# doesn't take the rest of the batch down with it.
+def _ingest_worker(job):
+    file_path, config = job
+    with collect() as records:
+        try:
+            if config is not None:
+                return ingest_export(file_path, config), None, records
+            return ingest_workbook(file_path), None, records
+        except Exception as e:
+            return None, str(e), records
+
+
+# Default worker count, overridable with NSF_INGEST_WORKERS (1 disables the process pool)
+def default_workers():
+    return int(os.environ.get("NSF_INGEST_WORKERS", os.cpu_count() or 1))
+
+
+# Bring the columnar cache up to date for file_paths, parsing stale workbooks and exports in
+# parallel. Results are merged in file_paths order; returns the set of files that failed.
+def ingest_all(file_paths, manifest, workers=None, export_config=None):
+    workers = default_workers() if workers is None else workers
+    if export_config is None and any(is_export(file) for file in file_paths):
+        export_config = load_export_config(os.path.dirname(file_paths[0]))
+    config_hash = export_config_hash(export_config) if export_config is not None else None
+    failed = set()
+    pending = []
+    for file in file_paths:
+        try:
+            if failed_unchanged(file, manifest, config_hash if is_export(file) else None):
+                failed.add(file)
+                continue
+            stale = stale_workbook(file, manifest, config_hash if is_export(file) else None)
+        except Exception as e:
+            print(f"Failed to process {file}: {e}")
+            failed.add(file)
+            continue
+        if stale is not None:
+            pending.append((file, stale))
+
+    jobs = [(file, export_config if is_export(file) else None) for file, _ in pending]
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            results = list(pool.map(_ingest_worker, jobs))
+    else:
+        results = [_ingest_worker(job) for job in jobs]
+
+    for (file, (stat, digest)), (sheets, error, records) in zip(pending, results):
+        # Stage timings recorded in the worker process
+        extend(records)
+        if error is not None:
+            # Remembered until the file changes, so it is reported once rather than on every refresh
+            print(f"Failed to process {file}: {error}")
+            manifest[file] = {
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": digest,
+                "config": config_hash if is_export(file) else None,
+                "error": error,
+            }
+            failed.add(file)
+            continue
+        manifest[file] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": digest,
+            "schema": SCHEMA_VERSION,
+            "config": config_hash if is_export(file) else None,
+            "sheets": sheets,
+        }
+    return failed
+
+
+def read_partition(file_path, sheet_name):
+    return feather.read_table(partition_path(file_path, sheet_name), memory_map=True).to_pandas()
+
+
+# Long-format data for a fixed set of sheets that follows data_dir incrementally.
+# Each refresh() re-ingests only added or modified workbooks and evicts the rows of
+# deleted ones, so adding one institution costs one parse rather than a full rebuild.
+# With the shared store enabled the frames are memory-mapped from the version published
+# there, and only the first process to see a new version builds and publishes it.
+class Dataset:
+    def __init__(self, sheet_names, data_dir=DATA_DIR, workers=None, shared=None):
+        self.sheet_names = list(sheet_names)
+        self.data_dir = data_dir
+        self.workers = workers
+        self.shared = os.environ.get("NSF_SHARED_STORE", "1") != "0" if shared is None else shared
+        self.store_dir = os.path.join(STORE_DIR, os.path.normpath(data_dir).replace(os.sep, "_"))
+        self.manifest = {}
+        self._manifest_stamp = None
+        # file path -> (sha256, export config hash) of the partitions currently held in memory
+        self.loaded = {}
+        # sheet name -> {file path: that workbook's rows}, including inputs of derived sheets
+        source_sheets = list(self.sheet_names)
+        for sheet_name in self.sheet_names:
+            for input_sheet in DERIVED_SHEETS.get(sheet_name, ([], None))[0]:
+                if input_sheet not in source_sheets:
+                    source_sheets.append(input_sheet)
+        self.parts = {sheet_name: {} for sheet_name in source_sheets}
+        self.frames = {sheet_name: pd.DataFrame() for sheet_name in self.sheet_names}
+        self.indexes = {sheet_name: SheetIndex(frame) for sheet_name, frame in self.frames.items()}
+        self.version = None
+        self._cubes = {}
+        self._analytics = {}
+        self._aggregates = {}
+        self._tables = {}
+        self._registry = None
+        self._display_names = {}
+        self._institutions = []
+        self.hierarchies = {sheet_name: {} for sheet_name in self.sheet_names}
+        self._lock = threading.RLock()
+
+    # Manifest as last written by any process, re-read only when the file changed
+    def _reload_manifest(self):
+        stamp = manifest_stamp()
+        if stamp != self._manifest_stamp:
+            self.manifest = load_manifest()
+            self._manifest_stamp = stamp
+
+    # Bring the in-memory frames in line with data_dir. Returns True when anything changed.
+    def refresh(self):
+        with self._lock:
+            file_paths = source_files(self.data_dir)
+            export_config = load_export_config(self.data_dir) if any(is_export(file) for file in file_paths) else None
+            # Other processes may have ingested files since the last refresh; their manifest
+            # entries keep this one from parsing the same files again
+            self._reload_manifest()
+            before = json.loads(json.dumps(self.manifest))
+            failed = ingest_all(file_paths, self.manifest, self.workers, export_config)
+            deleted = self._evict_deleted(file_paths)
+
+            # Exports also change when the config that shaped them does
+            current = {file: (self.manifest[file]["sha256"], self.manifest[file].get("config")) for file in file_paths if file not in failed}
+            changed = {file: entry for file, entry in self.manifest.items() if before.get(file) != entry}
+            if deleted or changed:
+                self.manifest = save_manifest(changed, deleted)
+                self._manifest_stamp = manifest_stamp()
+            # Institution names are part of the version too, so renames reach cached views
+            institutions = load_institutions_config(self.data_dir)
+            fingerprint = [SCHEMA_VERSION, sorted(current.items())] + ([institutions] if institutions else [])
+            version = hashlib.sha256(json.dumps(fingerprint).encode()).hexdigest()[:16]
+            if version == self.version:
+                return False
+            self.version = version
+            self._institutions = institutions
+            self._display_names = {university_name_from_path(file): display_name_from_path(file) for file in file_paths if not is_export(file)}
+
+            # Another process may already have published this version
+            frames = shared_store.attach(self.store_dir, version, self.sheet_names) if self.shared else None
+            if frames is None:
+                frames = self._build(file_paths, current)
+                if self.shared:
+                    with stage("publish to shared store", rows=sum(len(frame) for frame in frames.values())):
+                        shared_store.publish(self.store_dir, version, {name: index_order(frame) for name, frame in frames.items()})
+                    frames = shared_store.attach(self.store_dir, version, self.sheet_names)
+            if self.shared:
+                # The shared copy replaces this process's partitions; a later build reloads
+                # them from the memory-mapped partition files
+                for parts in self.parts.values():
+                    parts.clear()
+                self.loaded = {}
+
+            self.frames = frames
+            for sheet_name in self.sheet_names:
+                self.indexes[sheet_name] = SheetIndex(frames[sheet_name], key=(sheet_name, version), presorted=self.shared)
+            self._cubes = {}
+            self._analytics = {}
+            self._tables = {}
+            self._registry = None
+            self.hierarchies = self._load_hierarchies()
+            # Peer statistics and rankings for the default focal institution are part of the
+            # refresh; other focal institutions are aggregated on first use
+            self._aggregates = {}
+            for sheet_name in self.sheet_names:
+                self.aggregates(sheet_name)
+            return True
+
+    # Frames of every sheet at the current version, loading only the partitions of workbooks
+    # that changed since the last build
+    def _build(self, file_paths, current):
+        removed = set(self.loaded) - set(current)
+        changed = [file for file in file_paths if file in current and self.loaded.get(file) != current[file]]
+        for file in removed:
+            for parts in self.parts.values():
+                parts.pop(file, None)
+            del self.loaded[file]
+        with stage("read partitions", rows=len(changed)):
+            for file in changed:
+                self._load_file(file)
+                self.loaded[file] = current[file]
+
+        frames = {}
+        for sheet_name in self.sheet_names:
+            if sheet_name in DERIVED_SHEETS:
+                frames[sheet_name] = self._derive(sheet_name, file_paths)
+            else:
+                parts = self.parts[sheet_name]
+                frames[sheet_name] = concat_frames([parts[file] for file in file_paths if file in parts]).drop(columns='Row', errors='ignore')
+        return frames
+
+    # Hierarchies are stored next to the partitions, one file per data version, so a restarted
+    # worker reads them back instead of rebuilding them
+    def _load_hierarchies(self):
+        path = os.path.join(self._cache_dir("hierarchy"), f"{self.version}.json")
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+
+        hierarchies = {}
+        for sheet_name in self.sheet_names:
+            if sheet_name not in stored and not self.frames[sheet_name].empty:
+                with stage("build hierarchy", rows=len(self.frames[sheet_name]), sheet=sheet_name):
+                    stored[sheet_name] = build_hierarchy(self.frames[sheet_name], MACRO_CATEGORIES.get(sheet_name, []))
+            hierarchies[sheet_name] = stored.get(sheet_name, {})
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(stored, f, indent=2)
+        os.replace(tmp_path, path)
+        # Drop the hierarchies of versions the shared store has retired
+        for stale in glob.glob(os.path.join(os.path.dirname(path), "*.json")):
+            if self._retired(os.path.basename(stale)[:-len(".json")]):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        return hierarchies
+
+    # Dense universities x categories x years cube of a sheet, built once per data version
+    def cube(self, sheet_name):
+        with self._lock:
+            if sheet_name not in self._cubes:
+                self._cubes[sheet_name] = build_cube(self.frames[sheet_name])
+            return self._cubes[sheet_name]
+
+    # Arrow table of a sheet in the row order of its index, so SheetIndex.ranges() address it
+    # directly. With the shared store this is the memory-mapped published file.
+    def table(self, sheet_name):
+        with self._lock:
+            if sheet_name not in self._tables:
+                path = shared_store.sheet_file(self.store_dir, self.version, sheet_name)
+                if self.shared and os.path.exists(path):
+                    self._tables[sheet_name] = feather.read_table(path, memory_map=True)
+                else:
+                    self._tables[sheet_name] = pa.Table.from_pandas(self.indexes[sheet_name].data, preserve_index=False)
+            return self._tables[sheet_name]
+
+    # Trend fits and forecasts of every (university, category) series of a sheet, fitted in
+    # one batch once per data version
+    def analytics(self, sheet_name):
+        with self._lock:
+            if sheet_name not in self._analytics:
+                cube = self.cube(sheet_name)
+                with stage("fit trends", rows=len(cube.universities) * len(cube.categories), sheet=sheet_name):
+                    self._analytics[sheet_name] = build_analytics(cube)
+            return self._analytics[sheet_name]
+
+    # Registry of the institutions in any loaded sheet, with their display names and aliases,
+    # built once per data version
+    def registry(self):
+        with self._lock:
+            if self._registry is None:
+                universities = sorted({university for index in self.indexes.values() for university in index.universities()})
+                with stage("build registry", rows=len(universities)):
+                    self._registry = InstitutionRegistry(universities, self._display_names, self._institutions)
+            return self._registry
+
+    # Peer statistics and rankings of a sheet, materialized once per data version in the
+    # columnar cache and memory-mapped from there by every process. Rankings don't depend on
+    # the focal institution, so they are stored once per version.
+    def aggregates(self, sheet_name, focal=FOCAL_INSTITUTION):
+        with self._lock:
+            if (sheet_name, focal) not in self._aggregates:
+                self._aggregates[(sheet_name, focal)] = self._load_aggregates(sheet_name, focal)
+            return self._aggregates[(sheet_name, focal)]
+
+    # Cache directory of this data directory under `kind`, as the store keys it
+    def _cache_dir(self, kind):
+        return os.path.join(CACHE_DIR, kind, os.path.normpath(self.data_dir).replace(os.sep, "_"))
+
+    # Whether a cached version can go: only once the shared store no longer holds it, since
+    # other processes may still be serving it (or already serving a newer one)
+    def _retired(self, version):
+        return version != self.version and not os.path.isdir(os.path.join(self.store_dir, version))
+
+    def _load_aggregates(self, sheet_name, focal):
+        aggregates_dir = self._cache_dir("aggregates")
+        file_name = f"{sheet_name.replace(' ', '-')}.arrow"
+        version_dir = os.path.join(aggregates_dir, self.version, f"v{AGGREGATES_VERSION}")
+        ranks_path = os.path.join(version_dir, "ranks", file_name)
+        peers_path = os.path.join(version_dir, "peers", focal.replace(' ', '-'), file_name)
+
+        if not os.path.exists(ranks_path) or not os.path.exists(peers_path):
+            with stage("peer aggregates", rows=len(self.frames[sheet_name]), sheet=sheet_name):
+                cube = self.cube(sheet_name)
+                exclude = focal if focal in cube.universities else None
+                if not os.path.exists(ranks_path):
+                    shared_store.write_frame(rank_frame(cube), ranks_path)
+                shared_store.write_frame(peer_frame(cube, exclude), peers_path)
+            # Drop the aggregates of versions the shared store has retired
+            for stale in glob.glob(os.path.join(aggregates_dir, "*")):
+                if self._retired(os.path.basename(stale)):
+                    shutil.rmtree(stale, ignore_errors=True)
+
+        return PeerAggregates(shared_store.read_frame(peers_path), shared_store.read_frame(ranks_path), focal,
+                              key=(sheet_name, self.version, focal))
+
+    # Derived sheets are computed for all universities in one go and stored in the columnar
+    # cache, one file per data version; the source workbooks are never rewritten.
+    # Workbooks missing an input sheet fall back to their own copy of the sheet, if any.
+    def _derive(self, sheet_name, file_paths):
+        version_dir = self._cache_dir("derived")
+        path = os.path.join(version_dir, self.version, f"{sheet_name.replace(' ', '-')}.arrow")
+        if os.path.exists(path):
+            return feather.read_table(path, memory_map=True).to_pandas()
+
+        input_sheets, combine = DERIVED_SHEETS[sheet_name]
+        with stage("derive sheet", sheet=sheet_name) as record:
+            covered = [file for file in file_paths if all(file in self.parts[input_sheet] for input_sheet in input_sheets)]
+            frames = []
+            if covered:
+                inputs = [concat_frames([self.parts[input_sheet][file] for file in covered]) for input_sheet in input_sheets]
+                frames.append(combine(*inputs))
+            own = self.parts.get(sheet_name, {})
+            frames += [own[file] for file in file_paths if file not in covered and file in own]
+            data = concat_frames(frames).drop(columns='Row', errors='ignore')
+            record["rows"] = len(data)
+
+        # Drop the derived sheets of versions the shared store has retired
+        for stale in glob.glob(os.path.join(version_dir, "*")):
+            if self._retired(os.path.basename(stale)):
+                shutil.rmtree(stale, ignore_errors=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        feather.write_feather(data, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+        return data
+
+    def _load_file(self, file):
+        entry = self.manifest[file]
+        for sheet_name, parts in self.parts.items():
+            parts.pop(file, None)
+            if sheet_name not in entry["sheets"]:
+                derived_inputs = DERIVED_SHEETS.get(sheet_name, ([], None))[0]
+                # Exports usually cover only some of the sheets
+                if not is_export(file) and (not derived_inputs or not all(name in entry["sheets"] for name in derived_inputs)):
+                    print(f"Failed to process {file}: Worksheet named '{sheet_name}' not found")
+                continue
+            if entry["sheets"][sheet_name] is None:
+                continue
+            try:
+                parts[file] = read_partition(file, sheet_name)
+            except Exception as e:
+                print(f"Failed to process {file}: {e}")
+
+    # Drop manifest entries and partitions of workbooks that disappeared from data_dir
+    def _evict_deleted(self, file_paths):
+        present = set(file_paths)
+        deleted = [
+            file for file in self.manifest
+            if os.path.normpath(os.path.dirname(file)) == os.path.normpath(self.data_dir) and file not in present
+        ]
+        for file in deleted:
+            del self.manifest[file]
+            shutil.rmtree(partition_dir(file), ignore_errors=True)
+        return deleted
+
+
+# Long-format data for each requested sheet, opening every workbook in data_dir at most once.
+# Returns {sheet name: concatenated frame}. Stale workbooks are parsed by `workers`
+# processes (see ingest_all).
+def load_sheets(sheet_names, data_dir=DATA_DIR, workers=None):
+    dataset = Dataset(sheet_names, data_dir, workers)
+    dataset.refresh()
+    return dataset.frames
+
+
+def load_sheet(sheet_name, data_dir=DATA_DIR, workers=None):
+    return load_sheets([sheet_name], data_dir, workers)[sheet_name]
+
+
+# Wide view of one university's long-format rows: one row per year, one column per category
+def to_wide(data):
+    data = data.assign(Category=data['Category'].str.strip())
+    wide = data.groupby(['Year', 'Category'], sort=False, observed=True)['Value'].first().unstack()
+    wide.index = wide.index.astype(int)
+    return wide.sort_index()
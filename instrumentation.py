@@ -0,0 +1,113 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Python-level allocation tracing is precise but slows everything down, so it is opt-in.
+# Without it each stage reports how much its process's resident memory grew (or shrank)
+# over the stage instead.
+if os.environ.get("NSF_TRACE_MEMORY") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# Stage records of the current run. Streamlit serves every session on its own thread.
+_local = threading.local()
+
+
+def _records():
+    if not hasattr(_local, "records"):
+        _local.records = []
+    return _local.records
+
+
+# Current resident set size, or None where /proc isn't available
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Traced memory of the stages open on this thread, innermost last: [traced bytes at entry,
+# highest peak seen so far]. tracemalloc keeps a single peak for the process, so a stage
+# saves the peak reached so far into its parent before resetting it, and hands its own
+# peak back to the parent on exit.
+def _open_stages():
+    if not hasattr(_local, "open_stages"):
+        _local.open_stages = []
+    return _local.open_stages
+
+
+def _fold_peak(open_stages, peak):
+    if open_stages:
+        open_stages[-1][1] = max(open_stages[-1][1], peak)
+
+
+# Time a stage and record its wall time, rows processed and memory: the change in RSS over the
+# stage, plus, when tracing is on, the peak of traced allocations above what was already
+# allocated when it started (nested stages included). The yielded record can be updated
+# inside the block, e.g. record['rows'] = len(result).
+@contextlib.contextmanager
+def stage(name, rows=None, **labels):
+    record = {"stage": name, "rows": rows, **labels}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        open_stages = _open_stages()
+        current, peak = tracemalloc.get_traced_memory()
+        _fold_peak(open_stages, peak)
+        tracemalloc.reset_peak()
+        open_stages.append([current, current])
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 6)
+        if tracing:
+            entry, peak = open_stages.pop()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            record["peak_traced_bytes"] = peak - entry
+            _fold_peak(open_stages, peak)
+        rss_after = _rss_bytes()
+        record["rss_delta_bytes"] = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        _records().append(record)
+
+
+# Collect the stages recorded inside the block into their own list, e.g. in a pool worker
+# whose records are sent back to the parent process
+@contextlib.contextmanager
+def collect():
+    previous = _records()
+    _local.records = []
+    collected = _local.records
+    try:
+        yield collected
+    finally:
+        _local.records = previous
+
+
+# Add records gathered elsewhere (e.g. returned by a worker process) to the current run
+def extend(records):
+    _records().extend(records)
+
+
+def start_run():
+    _local.records = []
+    _local.started = time.perf_counter()
+
+
+# Summary of the current run: total wall time and every recorded stage
+def finish_run():
+    started = getattr(_local, "started", None)
+    run = {
+        "seconds": round(time.perf_counter() - started, 6) if started is not None else None,
+        "stages": list(_records()),
+    }
+    _local.records = []
+    return run
+
+
+def log_run(run):
+    print(json.dumps({"event": "rerun_timings", **run}))
@@ -1,63 +1,48 @@
 import streamlit as st
-import plotly.graph_objects as go
 from utils import *
 
 st.set_page_config(layout="wide",initial_sidebar_state="expanded")
 
-# Load data for each sheet
-# Graduate Students Data
-graduate_data = load_and_concatenate_data("Graduate Students")
-
-# Source Data
-source_data = load_and_concatenate_data("Source")
-
-# Postdoctorates Data
-postdoctorates_data = load_and_concatenate_data("Postdoctorates")
-
-# Define macro categories for Graduate Students
-graduate_macro_categories = ["All full-time students", "Science", "Engineering", "Health"]
-# Build hierarchy for Graduate Students
-graduate_hierarchy = build_hierarchy_by_positions(graduate_data, graduate_macro_categories)
-
-# Define macro categories for Source
-source_macro_categories = [
-    "All types and sources of support",
-    "Fellowships",
-    "Research assistantships",
-    "Teaching assistantships",
-    "Other types of support",
-    "Personal resources"
-]
-# Build hierarchy for Source
-source_hierarchy = build_hierarchy_by_positions(source_data, source_macro_categories)
-
-# Define macro categories for Postdoctorates
-postdoctorates_macro_categories = ["Science", "Engineering", "Health"]
-# Build hierarchy for Postdoctorates
-postdoctorates_hierarchy = build_hierarchy_by_positions(postdoctorates_data, postdoctorates_macro_categories)
-
+# Record how long each stage of this rerun takes (reported at the bottom of the script)
+start_run()
 
 # Sidebar for navigation
 st.sidebar.title("Navigation")
 page = st.sidebar.radio("Select a page:", ["Graduate Students", "Source", "Postdoctorates"])
 
+# Only the selected page's sheet is loaded, indexed and given a hierarchy; the other pages
+# are loaded the first time they are opened
+dataset = load_dataset((page,))
+data = dataset.frames[page]
+index = dataset.indexes[page]
+hierarchy = dataset.hierarchies[page]
+macro_categories = MACRO_CATEGORIES[page]
+
+# Canonical names, IDs and aliases of every institution; widgets pick university keys and
+# show registry names, so no name goes through a case conversion and back
+registry = dataset.registry()
 
+# Institution compared against its peers (NSF_FOCAL_INSTITUTION sets the default). Peer bands
+# and rankings are precomputed by the loader for the default and aggregated once for others.
+focal_options = index.universities()
+focal_position = focal_options.index(FOCAL_INSTITUTION) if FOCAL_INSTITUTION in focal_options else 0
+focal_institution = st.sidebar.selectbox("Focal institution:", focal_options, index=focal_position, format_func=registry.display) if focal_options else FOCAL_INSTITUTION
+aggregates = dataset.aggregates(page, focal_institution)
 
 
 # Page for Graduate Students
 if page == "Graduate Students":
     st.title("Graduate Students Information")
-    data = graduate_data
-    hierarchy = graduate_hierarchy
-    macro_categories = graduate_macro_categories
-
-    available_universities = data['University'].unique()
+    available_universities = index.universities()
 
     analysis_level = st.radio("Select analysis level:", ["Macro (Comparison between Universities)", "Micro (Individual Analysis)"])
 
     if analysis_level == "Macro (Comparison between Universities)":
         selected_macro_category = st.selectbox("Select macro category:", macro_categories)
-        plot_macro_level(selected_macro_category, data, "Graduate Students")
+        macro_view = plot_macro_level(selected_macro_category, index, "Graduate Students", aggregates=aggregates, registry=registry)
+        if macro_view:
+            selected_universities, years = macro_view
+            show_export(dataset, page, [selected_macro_category], selected_universities, years)
     else:
         selected_macro_category = st.selectbox("Select macro category:", macro_categories)
         subcategories = hierarchy.get(selected_macro_category, [])
@@ -68,32 +53,38 @@ if page == "Graduate Students":
             if not selected_subcategories:
                 st.write("Please select at least one subcategory to compare.")
             else:
-                selected_university = 'Old Dominion U'
-                comparison_university = st.selectbox(
-                    "Select a university to compare with Old Dominion U:",
-                    [u.title() for u in available_universities if u != 'Old Dominion U']
-                )
-                comparison_university_lower = comparison_university.lower()
-                plot_micro_level_multiple_subcategories(
-                    selected_macro_category, selected_university, comparison_university_lower,
-                    data, "Graduate Students", selected_subcategories
+                selected_university = focal_institution
+                # Nearest peers by enrollment, support mix, postdocs and growth are offered first
+                similar_universities = show_similar_institutions(focal_institution, available_universities, registry)
+                comparison_university = institution_picker(
+                    f"Select a university to compare with {registry.display(focal_institution)}:",
+                    registry, [u for u in available_universities if u != focal_institution], key="comparison_university", suggested=similar_universities
                 )
+                if comparison_university is None:
+                    st.write("No university matches the search.")
+                else:
+                    plot_micro_level_multiple_subcategories(
+                        selected_macro_category, selected_university, comparison_university,
+                        index, "Graduate Students", selected_subcategories, analytics=dataset.analytics(page),
+                        registry=registry
+                    )
+                    show_export(dataset, page, selected_subcategories, [selected_university, comparison_university])
 
 # Page for Source
 elif page == "Source":
     st.title("Financial Support Information")
-    data = source_data
-    hierarchy = source_hierarchy
-    macro_categories = source_macro_categories
 
     if not data.empty:
-        available_universities = data['University'].unique()
+        available_universities = index.universities()
 
         analysis_level = st.radio("Select analysis level:", ["Macro (Comparison between Universities)", "Micro (Individual Analysis)"])
 
         if analysis_level == "Macro (Comparison between Universities)":
             selected_macro_category = st.selectbox("Select macro category:", macro_categories)
-            plot_macro_level(selected_macro_category, data, "Financial Support")
+            macro_view = plot_macro_level(selected_macro_category, index, "Financial Support", aggregates=aggregates, registry=registry)
+            if macro_view:
+                selected_universities, years = macro_view
+                show_export(dataset, page, [selected_macro_category], selected_universities, years)
         else:
             selected_macro_category = st.selectbox("Select macro category:", macro_categories)
             subcategories = hierarchy.get(selected_macro_category, [])
@@ -104,32 +95,38 @@ elif page == "Source":
                 if not selected_subcategories:
                     st.write("Please select at least one subcategory to compare.")
                 else:
-                    selected_university = 'Old Dominion U'
-                    comparison_university = st.selectbox(
-                        "Select a university to compare with Old Dominion U:",
-                        [u.title() for u in available_universities if u != 'Old Dominion U']
-                    )
-                    comparison_university_lower = comparison_university.lower()
-                    plot_micro_level_multiple_subcategories(
-                        selected_macro_category, selected_university, comparison_university_lower,
-                        data, "Financial Support", selected_subcategories
+                    selected_university = focal_institution
+                    # Nearest peers by enrollment, support mix, postdocs and growth are offered first
+                    similar_universities = show_similar_institutions(focal_institution, available_universities, registry)
+                    comparison_university = institution_picker(
+                        f"Select a university to compare with {registry.display(focal_institution)}:",
+                        registry, [u for u in available_universities if u != focal_institution], key="comparison_university", suggested=similar_universities
                     )
+                    if comparison_university is None:
+                        st.write("No university matches the search.")
+                    else:
+                        plot_micro_level_multiple_subcategories(
+                            selected_macro_category, selected_university, comparison_university,
+                            index, "Financial Support", selected_subcategories, analytics=dataset.analytics(page),
+                            registry=registry
+                        )
+                        show_export(dataset, page, selected_subcategories, [selected_university, comparison_university])
                     
 # Page for Postdoctorates
 elif page == "Postdoctorates":
     st.title("Postdoctorates Information")
-    data = postdoctorates_data
-    hierarchy = postdoctorates_hierarchy
-    macro_categories = postdoctorates_macro_categories
 
     if not data.empty:
-        available_universities = data['University'].unique()
+        available_universities = index.universities()
 
         analysis_level = st.radio("Select analysis level:", ["Macro (Comparison between Universities)", "Micro (Individual Analysis)"])
 
         if analysis_level == "Macro (Comparison between Universities)":
             selected_macro_category = st.selectbox("Select macro category:", macro_categories)
-            plot_macro_level(selected_macro_category, data, "Postdoctorates")
+            macro_view = plot_macro_level(selected_macro_category, index, "Postdoctorates", aggregates=aggregates, registry=registry)
+            if macro_view:
+                selected_universities, years = macro_view
+                show_export(dataset, page, [selected_macro_category], selected_universities, years)
         else:
             selected_macro_category = st.selectbox("Select macro category:", macro_categories)
             subcategories = hierarchy.get(selected_macro_category, [])
@@ -141,18 +138,25 @@ elif page == "Postdoctorates":
                 if not selected_subcategories:
                     st.write("Please select at least one subcategory to compare.")
                 else:
-                    # Standardize university names to lowercase
-                    available_universities = [u.strip().lower() for u in available_universities]
-                    selected_university = 'Old Dominion U'
-                    comparison_university = st.selectbox(
-                        "Select a university to compare with Old Dominion U:",
-                        [u.title() for u in available_universities if u != 'Old Dominion U']
-                    )
-                    comparison_university_lower = comparison_university.lower()
-                    # **Use the multiple subcategories plotting function**
-                    plot_micro_level_multiple_subcategories(
-                        selected_macro_category, selected_university, comparison_university_lower,
-                        data, "Postdoctorates", selected_subcategories
+                    selected_university = focal_institution
+                    # Nearest peers by enrollment, support mix, postdocs and growth are offered first
+                    similar_universities = show_similar_institutions(focal_institution, available_universities, registry)
+                    comparison_university = institution_picker(
+                        f"Select a university to compare with {registry.display(focal_institution)}:",
+                        registry, [u for u in available_universities if u != focal_institution], key="comparison_university", suggested=similar_universities
                     )
+                    if comparison_university is None:
+                        st.write("No university matches the search.")
+                    else:
+                        # **Use the multiple subcategories plotting function**
+                        plot_micro_level_multiple_subcategories(
+                            selected_macro_category, selected_university, comparison_university,
+                            index, "Postdoctorates", selected_subcategories, analytics=dataset.analytics(page),
+                            registry=registry
+                        )
+                        show_export(dataset, page, selected_subcategories, [selected_university, comparison_university])
     else:
         st.write("No data available for Postdoctorates.")
+
+# Timings of this rerun: a JSON log line, plus the sidebar panel when debugging
+report_run_timings()
@@ -0,0 +1,62 @@
+import sys
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# Approximate memory held by a cached result: deep memory usage for frames and series,
+# the summed size of the items for tuples and lists
+def result_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(result_bytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+# Least recently used results of filter and aggregation queries, bounded by a byte budget
+# rather than an entry count. Entries are tagged with the data version they were computed
+# from; the first lookup against a newer version drops everything older.
+class QueryCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def get(self, key, version, compute):
+        if version != self.version:
+            self.clear()
+            self.version = version
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+        self.misses += 1
+        value = compute()
+        size = result_bytes(value)
+        if size > self.max_bytes:
+            # Never worth evicting everything else for a result that cannot fit anyway
+            return value
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+        return value
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,184 @@
+import bisect
+import re
+from collections import Counter
+
+# Queries shorter than this are answered from the prefix index only
+MIN_TRIGRAM_QUERY = 3
+
+# Trigram matches scoring below this share of common trigrams are dropped
+MIN_TRIGRAM_SCORE = 0.25
+
+
+# Case, punctuation and separator insensitive form of a name, used for matching only;
+# "Uniformed-Services-U. Health-Sciences" and "uniformed services u health sciences" agree
+def normalize(name):
+    return re.sub(r"[^0-9a-z]+", " ", str(name).lower()).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Stable identifier of an institution, derived from its name unless the config gives one
+def institution_id(name):
+    return normalize(name).replace(" ", "-")
+
+
+# Every institution in the loaded data with a stable ID, a display name, its aliases and the
+# university key it has in the long-format frames. Lookups go through IDs and keys, never
+# through case conversions of display names.
+#
+# Search combines a sorted prefix index over names, name words and aliases (bisect, so a
+# lookup costs O(log n) plus the matches) with a trigram inverted index for typos and
+# fragments that don't start a word.
+class InstitutionRegistry:
+    def __init__(self, universities, display_names=None, config=None):
+        display_names = display_names or {}
+        self.ids = []
+        self._keys = {}
+        self._names = {}
+        self._aliases = {}
+        self._by_key = {}
+        self._by_alias = {}
+
+        for university in universities:
+            name = display_names.get(university) or university.title()
+            self._add(self._unique_id(institution_id(university)), university, name)
+
+        # Configured names, IDs and aliases, matched to the data by any of their names
+        for entry in config or []:
+            names = [entry.get("name", "")] + list(entry.get("aliases", []))
+            match = next((self._by_alias[normalize(name)] for name in names if normalize(name) in self._by_alias), None)
+            if match is None:
+                continue
+            if entry.get("name"):
+                self._names[match] = entry["name"]
+            if entry.get("id") and entry["id"] != match:
+                if entry["id"] in self._keys:
+                    print(f"Ignoring institution ID {entry['id']} for {self._keys[match]}: already used by {self._keys[entry['id']]}")
+                else:
+                    self._rename(match, entry["id"])
+                    match = entry["id"]
+            for alias in names:
+                if normalize(alias) and normalize(alias) not in self._by_alias:
+                    self._aliases[match].append(alias)
+                    self._by_alias[normalize(alias)] = match
+
+        self._build_search_index()
+
+    # Keys that only differ in case or punctuation ("U. Dayton", "U Dayton") normalize to the
+    # same ID; later ones get a numeric suffix so every key keeps its own institution
+    def _unique_id(self, institution):
+        candidate, suffix = institution, 2
+        while candidate in self._keys:
+            candidate, suffix = f"{institution}-{suffix}", suffix + 1
+        return candidate
+
+    def _add(self, institution, university, name):
+        self.ids.append(institution)
+        self._keys[institution] = university
+        self._names[institution] = name
+        self._aliases[institution] = []
+        self._by_key[university] = institution
+        self._by_alias.setdefault(normalize(university), institution)
+        self._by_alias.setdefault(normalize(name), institution)
+
+    def _rename(self, old, new):
+        self.ids[self.ids.index(old)] = new
+        for mapping in (self._keys, self._names, self._aliases):
+            mapping[new] = mapping.pop(old)
+        self._by_key[self._keys[new]] = new
+        for alias, institution in self._by_alias.items():
+            if institution == old:
+                self._by_alias[alias] = new
+
+    def _build_search_index(self):
+        terms = []
+        self._trigrams = {}
+        self._name_trigrams = {}
+        for institution in self.ids:
+            names = {normalize(self._names[institution]), normalize(self._keys[institution])}
+            names.update(normalize(alias) for alias in self._aliases[institution])
+            for name in names:
+                words = name.split()
+                # Every word suffix of a name, so "texas" finds "U Texas The San Antonio"
+                terms.extend((" ".join(words[i:]), institution) for i in range(len(words)))
+            grams = set().union(*(trigrams(name) for name in names))
+            self._name_trigrams[institution] = len(trigrams(normalize(self._names[institution])))
+            for gram in grams:
+                self._trigrams.setdefault(gram, []).append(institution)
+        terms.sort()
+        self._prefix_terms = [term for term, _ in terms]
+        self._prefix_ids = [institution for _, institution in terms]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def key(self, institution):
+        return self._keys[institution]
+
+    def name(self, institution):
+        return self._names[institution]
+
+    def aliases(self, institution):
+        return list(self._aliases[institution])
+
+    def id_for_key(self, university):
+        return self._by_key.get(university)
+
+    # Display name of a university key as used in the frames
+    def display(self, university):
+        institution = self._by_key.get(university)
+        return self._names[institution] if institution is not None else str(university).title()
+
+    # {university key: display name}, e.g. for Series.map over a University column
+    def display_names(self):
+        return {self._keys[institution]: self._names[institution] for institution in self.ids}
+
+    # Institution ID of any known name, alias or university key, or None
+    def resolve(self, name):
+        return self._by_alias.get(normalize(name))
+
+    def _prefix_matches(self, query):
+        matches = []
+        position = bisect.bisect_left(self._prefix_terms, query)
+        while position < len(self._prefix_terms) and self._prefix_terms[position].startswith(query):
+            matches.append(self._prefix_ids[position])
+            position += 1
+        return matches
+
+    # IDs of the institutions best matching a partial name: prefix matches first (names
+    # starting with the query before names with a later word starting with it), then trigram
+    # matches by similarity. `within` restricts the results to a set of IDs.
+    def search(self, query, limit=20, within=None):
+        query = normalize(query)
+        if not query:
+            return []
+        results = []
+        seen = set()
+
+        def add(institution):
+            if institution not in seen and (within is None or institution in within):
+                seen.add(institution)
+                results.append(institution)
+
+        prefix = self._prefix_matches(query)
+        starts = [institution for institution in prefix if normalize(self._names[institution]).startswith(query)]
+        for institution in sorted(starts, key=self._names.get) + sorted(prefix, key=self._names.get):
+            add(institution)
+
+        if len(results) < limit and len(query) >= MIN_TRIGRAM_QUERY:
+            query_grams = trigrams(query)
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self._trigrams.get(gram, ()))
+            scored = []
+            for institution, count in shared.items():
+                score = count / (len(query_grams) + self._name_trigrams[institution] - count)
+                if score >= MIN_TRIGRAM_SCORE or count == len(query_grams):
+                    scored.append((-score, self._names[institution], institution))
+            for _, _, institution in sorted(scored):
+                add(institution)
+
+        return results[:limit]
@@ -0,0 +1,100 @@
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+# Read-only copies of the loaded sheets shared by every server process on a host. Each data
+# version is published once as uncompressed single-chunk Arrow files:
+#
+#   <store dir>/<version>/<Sheet-Name>.arrow
+#   <store dir>/CURRENT        name of the latest published version
+#
+# Readers memory-map the files and wrap the Arrow buffers in pandas objects without copying,
+# so N workers share one copy of the data in the page cache instead of holding N private
+# copies. Files are only ever replaced with os.replace, so a reader sees either the old or the
+# new version, never a partially written one.
+CURRENT_FILE = "CURRENT"
+
+
+def sheet_file(store_dir, version, sheet_name):
+    return os.path.join(store_dir, version, f"{sheet_name.replace(' ', '-')}.arrow")
+
+
+# Single chunk per column, and NaN kept as a float value rather than turned into a null,
+# so every column can be read back without a copy
+def _to_table(data):
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = pa.DictionaryArray.from_arrays(values.cat.codes.to_numpy(), values.cat.categories.to_numpy(dtype=object))
+        else:
+            columns[column] = pa.array(values.to_numpy(), from_pandas=False)
+    return pa.table(columns)
+
+
+def write_frame(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = _to_table(data)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed", chunksize=max(table.num_rows, 1))
+    os.replace(tmp_path, path)
+
+
+# Frame backed by the memory-mapped file: numeric columns and categorical codes point
+# straight into the mapping, only the category labels are materialized
+def read_frame(path):
+    table = feather.read_table(path, memory_map=True)
+    if table.num_rows == 0 or any(column.num_chunks != 1 for column in table.columns):
+        return table.to_pandas()
+
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        chunk = column.chunk(0)
+        if pa.types.is_dictionary(chunk.type):
+            codes = chunk.indices.to_numpy(zero_copy_only=True)
+            columns[name] = pd.Categorical.from_codes(codes, categories=chunk.dictionary.to_pandas())
+        else:
+            columns[name] = chunk.to_numpy(zero_copy_only=True)
+    return pd.DataFrame(columns, copy=False)
+
+
+def current_version(store_dir):
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+# Frames of `sheet_names` at `version`, or None when that version hasn't been published
+# for all of them yet
+def attach(store_dir, version, sheet_names):
+    paths = {sheet_name: sheet_file(store_dir, version, sheet_name) for sheet_name in sheet_names}
+    if not all(os.path.exists(path) for path in paths.values()):
+        return None
+    return {sheet_name: read_frame(path) for sheet_name, path in paths.items()}
+
+
+# Write the frames of a version, then swap CURRENT over to it. Sheets another worker already
+# published for this version are left alone. Versions older than the previous one are
+# removed; processes still mapping them keep their pages until they re-attach.
+def publish(store_dir, version, frames):
+    for sheet_name, data in frames.items():
+        path = sheet_file(store_dir, version, sheet_name)
+        if not os.path.exists(path):
+            write_frame(data, path)
+
+    previous = current_version(store_dir)
+    pointer = os.path.join(store_dir, CURRENT_FILE)
+    tmp_path = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, pointer)
+
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        if os.path.isdir(path) and name not in (version, previous):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+
+# Rows sorted the way SheetIndex lays them out
+def index_order(data):
+    if data.empty:
+        return data
+    return data.sort_values(['Category', 'University', 'Year'], kind='stable', ignore_index=True)
+
+
+# Long-format rows of one sheet sorted by (Category, University, Year), with the row range of
+# every category and every (category, university) pair. Lookups return slices of the sorted
+# frame, so their cost depends on the size of the answer rather than of the whole corpus.
+# `key` identifies the sheet and data version the index was built from, for caches of
+# results derived from it. Pass presorted=True for data already in index_order, e.g. frames
+# attached from the shared store, to index them in place instead of sorting a copy.
+class SheetIndex:
+    def __init__(self, data, key=None, presorted=False):
+        self.key = key
+        self._categories = {}
+        self._pairs = {}
+        self._universities = {}
+        self._all_universities = []
+        if data.empty:
+            self.data = data
+            return
+
+        if not presorted:
+            data = index_order(data)
+        self.data = data
+
+        category_codes = data['Category'].cat.codes.to_numpy()
+        university_codes = data['University'].cat.codes.to_numpy()
+        boundaries = np.flatnonzero((np.diff(category_codes) != 0) | (np.diff(university_codes) != 0)) + 1
+        starts = np.r_[0, boundaries]
+        stops = np.r_[boundaries, len(data)]
+
+        categories = data['Category'].cat.categories
+        universities = data['University'].cat.categories
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            category = categories[category_codes[start]]
+            university = universities[university_codes[start]]
+            self._pairs[(category, university)] = (start, stop)
+            first, _ = self._categories.get(category, (start, stop))
+            self._categories[category] = (first, stop)
+            self._universities.setdefault(category, []).append(university)
+        # In category order, like the column's categories with the unused ones removed
+        self._all_universities = universities[np.unique(university_codes[starts])].tolist()
+
+    def _slice(self, bounds):
+        start, stop = bounds
+        return self.data.iloc[start:stop]
+
+    def _empty(self):
+        return self.data.iloc[0:0]
+
+    # Every university that has data in the sheet
+    def universities(self, category=None):
+        if category is not None:
+            return list(self._universities.get(category, []))
+        return list(self._all_universities)
+
+    # All rows of one category, sorted by university then year
+    def category(self, category):
+        bounds = self._categories.get(category)
+        return self._slice(bounds) if bounds else self._empty()
+
+    # Rows of one (category, university) series, sorted by year
+    def series(self, category, university):
+        bounds = self._pairs.get((category, university))
+        return self._slice(bounds) if bounds else self._empty()
+
+    # Row ranges of the sorted frame holding the given categories, optionally only for the
+    # given universities, in the order select() returns them
+    def ranges(self, categories, universities=None):
+        if universities is None:
+            return [self._categories[category] for category in categories if category in self._categories]
+        return [
+            self._pairs[(category, university)]
+            for category in categories
+            for university in universities
+            if (category, university) in self._pairs
+        ]
+
+    # Rows for every combination of the given categories and universities
+    def select(self, categories, universities):
+        slices = [
+            self._slice(self._pairs[(category, university)])
+            for category in categories
+            for university in universities
+            if (category, university) in self._pairs
+        ]
+        return pd.concat(slices) if slices else self._empty()
@@ -0,0 +1,165 @@
+import os
+
+import numpy as np
+
+from analytics import compound_growth
+
+# Years behind the growth features, and the number of nearest peers suggested by default
+GROWTH_YEARS = int(os.environ.get("NSF_SIMILARITY_GROWTH_YEARS", "5"))
+SIMILAR_PEERS = int(os.environ.get("NSF_SIMILAR_PEERS", "10"))
+
+# When more than this share of institutions changed between two versions, the scaling is
+# refitted and the whole distance matrix rebuilt instead of updating the changed rows
+REFIT_FRACTION = 0.2
+
+# Rows of the distance matrix computed at a time, bounding the temporaries to block x n
+BLOCK_ROWS = 1024
+
+
+# Last observed value of every series of values (..., years)
+def latest_values(values):
+    observed = ~np.isnan(values)
+    last = values.shape[-1] - 1 - np.argmax(observed[..., ::-1], axis=-1)
+    latest = np.take_along_axis(values, last[..., None], axis=-1)[..., 0]
+    return np.where(observed.any(axis=-1), latest, np.nan)
+
+
+# Features of every university of one sheet's cube: the size of its total (log scale), the
+# share of each part in it, and the compound growth of the total and of every part over the
+# last GROWTH_YEARS years. `total` may be None when the parts don't have a total category,
+# in which case they are summed. Returns (names, universities x features array).
+def sheet_features(cube, sheet_name, total, parts):
+    parts = [part for part in parts if part in cube.categories]
+    if not parts or not cube.universities:
+        return [], np.empty((len(cube.universities), 0))
+    values = cube.values.astype(np.float64)
+    part_values = values[:, [cube.category_position(part) for part in parts]]
+    if total in cube.categories:
+        total_values = values[:, cube.category_position(total)]
+    else:
+        observed = ~np.isnan(part_values).all(axis=1)
+        total_values = np.where(observed, np.nansum(part_values, axis=1), np.nan)
+
+    latest_total = latest_values(total_values)
+    latest_parts = latest_values(part_values)
+    with np.errstate(all='ignore'):
+        shares = np.where(latest_total[:, None] > 0, latest_parts / latest_total[:, None], np.nan)
+
+    window = slice(-GROWTH_YEARS - 1, None)
+    t = np.asarray(cube.years, dtype=np.float64)[window]
+    growth = compound_growth(np.concatenate([total_values[:, None], part_values], axis=1)[..., window], t)
+
+    names = ([f"{sheet_name}: size"] + [f"{sheet_name}: {part} share" for part in parts]
+             + [f"{sheet_name}: growth"] + [f"{sheet_name}: {part} growth" for part in parts])
+    columns = np.column_stack([np.log1p(np.maximum(latest_total, 0)), shares, growth])
+    return names, columns
+
+
+# Feature matrix over the universities of every sheet, one block per sheet of `specs`
+# ({sheet name: (total category or None, part categories)}). A university missing from a
+# sheet has NaN features there. Returns (universities, feature names, universities x features).
+def similarity_features(cubes, specs):
+    universities = sorted({university for cube in cubes.values() for university in cube.universities})
+    positions = {university: i for i, university in enumerate(universities)}
+    names, blocks = [], []
+    for sheet_name, (total, parts) in specs.items():
+        if sheet_name not in cubes:
+            continue
+        cube = cubes[sheet_name]
+        sheet_names, columns = sheet_features(cube, sheet_name, total, parts)
+        block = np.full((len(universities), len(sheet_names)), np.nan)
+        block[[positions[university] for university in cube.universities]] = columns
+        names += sheet_names
+        blocks.append(block)
+    features = np.concatenate(blocks, axis=1) if blocks else np.empty((len(universities), 0))
+    return universities, names, features
+
+
+# Euclidean distances between the rows of a and b, computed in blocks of rows through
+# |a|^2 + |b|^2 - 2ab, so n institutions cost a few matrix products rather than n^2 loops
+def pairwise_distances(a, b):
+    distances = np.empty((len(a), len(b)), dtype=np.float32)
+    b_squared = (b * b).sum(axis=1)
+    for start in range(0, len(a), BLOCK_ROWS):
+        block = a[start:start + BLOCK_ROWS]
+        squared = (block * block).sum(axis=1)[:, None] + b_squared[None, :] - 2 * block @ b.T
+        distances[start:start + BLOCK_ROWS] = np.sqrt(np.maximum(squared, 0))
+    return distances
+
+
+# Distances between every pair of universities over standardized features. Each feature is
+# scaled to unit variance and missing values sit at the mean, so they add nothing to a
+# distance. Given the index of the previous data version, only institutions whose features
+# changed (or that are new) get their distance row and column recomputed, under the previous
+# scaling; the rest of the matrix is carried over.
+class SimilarityIndex:
+    def __init__(self, universities, names, features, previous=None):
+        self.universities = list(universities)
+        self.names = list(names)
+        self.features = features
+        self._positions = {university: i for i, university in enumerate(self.universities)}
+
+        changed = self._changed(previous)
+        if changed is not None and len(changed) <= REFIT_FRACTION * max(len(self.universities), 1):
+            self.center, self.scale = previous.center, previous.scale
+            self.standardized = self._standardize(features)
+            self.distances = self._update(previous, changed)
+            self.recomputed = len(changed)
+        else:
+            with np.errstate(all='ignore'):
+                center = np.nanmean(features, axis=0)
+                scale = np.nanstd(features, axis=0)
+            self.center = np.nan_to_num(center)
+            self.scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1)
+            self.standardized = self._standardize(features)
+            self.distances = pairwise_distances(self.standardized, self.standardized)
+            self.recomputed = len(self.universities)
+
+    def _standardize(self, features):
+        return np.nan_to_num((features - self.center) / self.scale, nan=0, posinf=0, neginf=0)
+
+    # Positions of the universities whose features differ from the previous index, or None
+    # when the previous index can't be updated (none, or other features)
+    def _changed(self, previous):
+        if previous is None or previous.names != self.names:
+            return None
+        old = np.array([previous._positions.get(university, -1) for university in self.universities], dtype=np.int64)
+        known = old >= 0
+        before = previous.features[np.where(known, old, 0)]
+        same = (before == self.features) | (np.isnan(before) & np.isnan(self.features))
+        return np.flatnonzero(~known | ~same.all(axis=1)).tolist()
+
+    def _update(self, previous, changed):
+        # Rows of new institutions are taken from row 0 and overwritten below
+        old = np.array([previous._positions.get(university, 0) for university in self.universities], dtype=np.int64)
+        if len(old) == len(previous.universities) and (old == np.arange(len(old))).all():
+            distances = previous.distances.copy()
+        else:
+            distances = previous.distances.take(old, axis=0).take(old, axis=1)
+        if changed:
+            rows = pairwise_distances(self.standardized[changed], self.standardized)
+            distances[changed, :] = rows
+            distances[:, changed] = rows.T
+        return distances
+
+    def __contains__(self, university):
+        return university in self._positions
+
+    # The k universities nearest to `university`, optionally among `within` only, as
+    # [(university, distance)] nearest first
+    def nearest(self, university, k=SIMILAR_PEERS, within=None):
+        if university not in self._positions:
+            return []
+        position = self._positions[university]
+        distances = self.distances[position].astype(np.float64)
+        distances[position] = np.inf
+        if within is not None:
+            allowed = np.zeros(len(distances), dtype=bool)
+            allowed[[self._positions[u] for u in within if u in self._positions]] = True
+            distances[~allowed] = np.inf
+        k = min(k, int(np.isfinite(distances).sum()))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(distances, k - 1)[:k]
+        order = candidates[np.argsort(distances[candidates], kind='stable')]
+        return [(self.universities[i], float(distances[i])) for i in order]
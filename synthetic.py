@@ -0,0 +1,175 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from ingest import DEFAULT_EXPORT_CONFIG, MACRO_CATEGORIES
+
+# Top-level rows of each generated sheet, and the label of its first header cell.
+# "Graduate Students" itself is derived from the full-time and part-time sheets by the loader.
+SHEET_LAYOUTS = {
+    "Full-time Graduate Students": ("All races", ["All full-time students"] + MACRO_CATEGORIES["Graduate Students"][1:]),
+    "Part-time Graduate Students": ("All races", ["All part-time students"] + MACRO_CATEGORIES["Graduate Students"][1:]),
+    "Source": ("Type and primary source of support", MACRO_CATEGORIES["Source"]),
+    "Postdoctorates": ("All races", MACRO_CATEGORIES["Postdoctorates"]),
+    "Earned Doctorates": ("Fields", ["All fields", "Science", "Engineering", "Non-science and engineering"]),
+}
+
+# xlsx writes one workbook per university; csv and parquet write a single bulk export of all
+# of them in the long layout of DEFAULT_EXPORT_CONFIG (see ingest_export)
+FORMATS = ["xlsx", "csv", "parquet"]
+EXPORT_NAME = "synthetic-export"
+
+
+# Rows of one sheet as (label, level): every top-level category gets `breadth` children per
+# level, `depth` levels deep. Nested rows are indented with spaces the way NSF indents them.
+def category_tree(macros, depth, breadth):
+    rows = []
+
+    def add(label, level):
+        rows.append(("   " * level + label, level))
+        if level < depth:
+            for i in range(breadth):
+                add(f"{label} {i + 1}", level + 1)
+
+    for macro in macros:
+        add(macro, 0)
+    return rows
+
+
+# Counts for one sheet of one university. Leaves follow a noisy trend around the university's
+# size; every other row is the sum of the rows nested directly below it.
+def sheet_values(rng, tree, years, scale):
+    values = np.zeros((len(tree), years), dtype=np.int64)
+    growth = rng.normal(0.02, 0.05)
+    trend = (1 + growth) ** -np.arange(years)  # columns run from the latest year backwards
+    for position in range(len(tree) - 1, -1, -1):
+        level = tree[position][1]
+        children = []
+        for child in range(position + 1, len(tree)):
+            if tree[child][1] <= level:
+                break
+            if tree[child][1] == level + 1:
+                children.append(child)
+        if children:
+            values[position] = values[children].sum(axis=0)
+        else:
+            base = scale * rng.lognormal(0, 1)
+            values[position] = rng.poisson(np.maximum(base * trend, 0))
+    return values
+
+
+# Rows as written to disk: optional blank category cells (the loader forward-fills them) and
+# comma-formatted thousands in a share of the cells
+def sheet_rows(rng, tree, values, gap_rate, comma_rate):
+    rows = []
+    for (label, _), counts in zip(tree, values):
+        cells = [f"{v:,}" if v >= 1000 and rng.random() < comma_rate else int(v) for v in counts]
+        rows.append([label] + cells)
+        if rng.random() < gap_rate:
+            extra = rng.poisson(np.maximum(counts * 0.1, 0))
+            rows.append([None] + [int(v) for v in extra])
+    return rows
+
+
+def university_name(position):
+    return f"Synthetic-U-{position:05d}"
+
+
+# Long-format export rows of one university: one row per category and year, with the sheet
+# name as the questionnaire. Blank-category rows have nothing to attach to in an export.
+def export_rows(name, sheets):
+    columns = DEFAULT_EXPORT_CONFIG["columns"]
+    records = []
+    for sheet_name, (header, rows) in sheets.items():
+        for row in rows:
+            if row[0] is None:
+                continue
+            for year, value in zip(header[1:], row[1:]):
+                records.append((name.replace("-", " "), year, row[0].strip(), str(value), sheet_name))
+    return pd.DataFrame(records, columns=[columns["university"], columns["year"], columns["category"], columns["value"], columns["sheet"]])
+
+
+# Write every sheet of one synthetic university, or return its export rows for csv and
+# parquet. Takes a single tuple so it can be mapped over a process pool.
+def write_university(job):
+    out_dir, position, fmt, years, first_year, depth, breadth, gap_rate, comma_rate, seed = job
+    rng = np.random.default_rng([seed, position])
+    scale = rng.lognormal(3, 1)
+    year_labels = [str(year) for year in range(first_year + years - 1, first_year - 1, -1)]
+    name = university_name(position)
+
+    sheets = {}
+    for sheet_name, (header, macros) in SHEET_LAYOUTS.items():
+        tree = category_tree(macros, depth, breadth)
+        values = sheet_values(rng, tree, years, scale)
+        sheets[sheet_name] = ([header] + year_labels, sheet_rows(rng, tree, values, gap_rate, comma_rate))
+
+    if fmt == "xlsx":
+        # write_only keeps openpyxl from building the whole workbook in memory
+        workbook = Workbook(write_only=True)
+        for sheet_name, (header, rows) in sheets.items():
+            worksheet = workbook.create_sheet(sheet_name)
+            worksheet.append(header)
+            for row in rows:
+                worksheet.append(row)
+        path = os.path.join(out_dir, f"{name}.xlsx")
+        workbook.save(path)
+        return path
+
+    return export_rows(name, sheets)
+
+
+# Write `universities` synthetic institutions to out_dir in the layout the loader expects.
+# Returns the paths written: one per university for xlsx, the single export otherwise.
+def generate(out_dir, universities=100, years=10, first_year=2013, depth=1, breadth=8, fmt="xlsx",
+             gap_rate=0.05, comma_rate=0.5, seed=0, workers=1):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [
+        (out_dir, position, fmt, years, first_year, depth, breadth, gap_rate, comma_rate, seed)
+        for position in range(universities)
+    ]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(write_university, jobs, chunksize=16))
+    else:
+        results = [write_university(job) for job in jobs]
+    if fmt == "xlsx":
+        return results
+
+    export = pd.concat(results, ignore_index=True)
+    path = os.path.join(out_dir, f"{EXPORT_NAME}.{fmt}")
+    if fmt == "csv":
+        export.to_csv(path, index=False)
+    else:
+        export.to_parquet(path, index=False)
+    return [path]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate NSF-shaped synthetic workbooks for load testing.")
+    parser.add_argument("out_dir", help="directory to write into (e.g. a scratch data/ directory)")
+    parser.add_argument("--universities", type=int, default=100)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--first-year", type=int, default=2013)
+    parser.add_argument("--depth", type=int, default=1, help="levels of subcategories below each macro category")
+    parser.add_argument("--breadth", type=int, default=8, help="subcategories per category and level")
+    parser.add_argument("--format", choices=FORMATS, default="xlsx")
+    parser.add_argument("--gap-rate", type=float, default=0.05, help="share of rows followed by a blank-category row")
+    parser.add_argument("--comma-rate", type=float, default=0.5, help="share of values >= 1000 written as '1,234'")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    generate(args.out_dir, args.universities, args.years, args.first_year, args.depth, args.breadth,
+             args.format, args.gap_rate, args.comma_rate, args.seed, args.workers)
+    print(f"Wrote {args.universities} synthetic universities to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import numpy as np
+
+from cube import SheetCube
+
+
+def make_cube(column):
+    values = np.array(column, dtype=np.float32).reshape(-1, 1, 1)
+    return SheetCube(values, [f"u{i}" for i in range(len(column))], ["Category"], [2022])
+
+
+def test_ties_share_competition_rank_and_percentile():
+    cube = make_cube([5, 7, 5, np.nan, 1])
+    assert cube.ranks()[:, 0, 0].tolist()[:3] == [2, 1, 2]
+    assert cube.ranks()[4, 0, 0] == 4
+    assert np.isnan(cube.ranks()[3, 0, 0])
+    percentiles = cube.percentiles()[:, 0, 0]
+    assert percentiles[0] == percentiles[2]
+    assert percentiles[1] == 100 and percentiles[4] == 0
+
+
+def test_all_zero_cell_ranks_everyone_first():
+    cube = make_cube([0, 0, 0])
+    assert cube.ranks()[:, 0, 0].tolist() == [1, 1, 1]
+    assert cube.percentiles()[:, 0, 0].tolist() == [100, 100, 100]
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from ingest import combine_graduate_students, concat_frames, tidy_sheet
+
+
+def make_sheet(first_row, values):
+    categories = [first_row, "Science", "Engineering", "Health"]
+    return pd.DataFrame({
+        "All races": categories,
+        "2021": [v if v is None else f"{v:,}" for v in values],
+        "2022": [v if v is None else f"{2 * v:,}" for v in values],
+    })
+
+
+def totals(data, university):
+    rows = data[data['University'] == university]
+    return rows.set_index(['Category', 'Year'])['Value'].to_dict()
+
+
+def test_blank_row_in_one_sheet_keeps_rows_aligned():
+    full_time = concat_frames([
+        tidy_sheet(make_sheet("All full-time students", [1000, 600, 300, 100]), "u a"),
+        tidy_sheet(make_sheet("All full-time students", [50, 20, 20, 10]), "u b"),
+    ])
+    # Science is blank in u a's part-time sheet, so its remaining rows sit one position earlier
+    part_time = concat_frames([
+        tidy_sheet(make_sheet("All part-time students", [200, None, 150, 50]), "u a"),
+        tidy_sheet(make_sheet("All part-time students", [5, 2, 2, 1]), "u b"),
+    ])
+
+    combined = combine_graduate_students(full_time, part_time)
+
+    assert list(combined['Category'].cat.categories) == ["All students", "Science", "Engineering", "Health"]
+    assert totals(combined, "u a") == {
+        ("All students", 2021): 1200, ("All students", 2022): 2400,
+        ("Science", 2021): 600, ("Science", 2022): 1200,
+        ("Engineering", 2021): 450, ("Engineering", 2022): 900,
+        ("Health", 2021): 150, ("Health", 2022): 300,
+    }
+    assert totals(combined, "u b")[("All students", 2021)] == 55
+    assert totals(combined, "u b")[("Health", 2022)] == 22
+    assert combined['Value'].dtype == np.float32
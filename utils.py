@@ -1,96 +1,94 @@
-import streamlit as st
-import glob
 import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
 import pandas as pd
-import plotly.express as px
+from ingest import FOCAL_INSTITUTION, MACRO_CATEGORIES, SIMILARITY_FEATURES, Dataset, build_hierarchy
+from analytics import TREND_METHODS
+from exporter import EXPORT_FORMATS, cached_export
+from instrumentation import finish_run, log_run, stage, start_run
+from query_cache import QueryCache
+from registry import InstitutionRegistry
+from similarity import SIMILAR_PEERS, SimilarityIndex, similarity_features
 
-# Adjusted function with checks for 'Category'
-@st.cache_data
-def load_and_concatenate_data(sheet_name):
-    all_data = []
-    file_paths = glob.glob("data/*.xlsx")
-    for file in file_paths:
-        try:
-            data = pd.read_excel(file, sheet_name=sheet_name, dtype=str)
-            if data.empty:
-                continue
-
-            # Ensure the first column is renamed to 'Category'
-            data.rename(columns={data.columns[0]: 'Category'}, inplace=True)
-
-            # Check if 'Category' column exists after renaming
-            if 'Category' not in data.columns:
-                print(f"'Category' column is missing in {file} after renaming.")
-                continue
-
-            data['Category'] = data['Category'].fillna(method='ffill')
-            data = data.dropna(subset=data.columns.difference(['Category']), how='all')
-            value_vars = [col for col in data.columns if col != 'Category']
-            data = data.melt(id_vars=['Category'], value_vars=value_vars, var_name='Year', value_name='Value')
-            data['Year'] = data['Year'].astype(str)
-            data['Value'] = pd.to_numeric(data['Value'].str.replace(',', ''), errors='coerce')
-            university_name = os.path.splitext(os.path.basename(file))[0].replace("-", " ").strip().lower()
-            data['University'] = university_name
-
-            all_data.append(data)
-        except Exception as e:
-            print(f"Failed to process {file}: {e}")
-
-    return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
-
-# Function to build hierarchy with initial data check
-def build_hierarchy_by_positions(data, macro_categories):
-    if 'Category' not in data.columns:
-        print("Error: 'Category' column not found in data passed to hierarchy builder.")
-        return {}
+# One incrementally refreshed dataset per sheet set, shared by every session on this server
+@st.cache_resource
+def get_dataset(sheet_names):
+    return Dataset(sheet_names)
 
-    unique_categories_in_order = data['Category'].drop_duplicates().tolist()
-    hierarchy = {}
-    macro_indices = [unique_categories_in_order.index(macro) for macro in macro_categories if macro in unique_categories_in_order]
-    macro_indices.append(len(unique_categories_in_order))
+# Workbooks are parsed once into the columnar cache (see ingest.py) and memory-mapped from there.
+# Every call re-checks data/ by mtime/size, so new, edited or deleted workbooks are picked up
+# without re-parsing the ones that didn't change. The dataset carries the frames, indexes,
+# hierarchies and cubes derived from the current version of the data.
+def load_dataset(sheet_names):
+    dataset = get_dataset(tuple(sheet_names))
+    dataset.refresh()
+    return dataset
 
-    for idx in range(len(macro_indices) - 1):
-        macro_idx = macro_indices[idx]
-        next_macro_idx = macro_indices[idx + 1]
-        hierarchy[unique_categories_in_order[macro_idx]] = unique_categories_in_order[macro_idx + 1:next_macro_idx]
+def load_all_sheets(sheet_names):
+    return load_dataset(sheet_names).frames
 
-    return hierarchy
+# Per-sheet SheetIndex built when the data is (re)loaded, for slicing without full scans
+def load_sheet_indexes(sheet_names):
+    return load_dataset(sheet_names).indexes
 
-def plot_macro_level(selected_macro_category, data, y_label):
-    filtered_data = data[data['Category'] == selected_macro_category].sort_values(by='Year')
-    if filtered_data.empty:
-        st.write(f"No data available for the category '{selected_macro_category}'.")
-        return
+# Universities x categories x years cube of one sheet, for peer statistics across institutions
+def load_sheet_cube(sheet_name, sheet_names):
+    return load_dataset(sheet_names).cube(sheet_name)
 
-    # Normalize university names for display
-    filtered_data['University_Display'] = filtered_data['University'].apply(lambda x: x.title())
+def load_and_concatenate_data(sheet_name):
+    return load_all_sheets((sheet_name,))[sheet_name]
 
-    # Ensure Old Dominion U is always included and cannot be removed
-    odu_display_name = "Old Dominion U"  # Adjust if the display name differs
-    available_universities = filtered_data['University_Display'].unique().tolist()
-    if odu_display_name in available_universities:
-        available_universities.remove(odu_display_name)
+# Hierarchies are normally precomputed per sheet by the loader (Dataset.hierarchies);
+# this builds one for an arbitrary frame
+def build_hierarchy_by_positions(data, macro_categories):
+    return build_hierarchy(data, macro_categories)
 
-    # Multiselect option for universities with ODU always included
-    selected_universities = st.multiselect(
-        "Select universities to visualize (ODU is always included):",
-        options=available_universities,
-        default=available_universities  # Default to all universities except ODU
-    )
+# Filtered and aggregated frames of this session's recent selections, so switching back and
+# forth between selections skips the lookups. Each session gets its own cache, bounded by
+# NSF_QUERY_CACHE_BYTES, and results of an older data version are dropped on the next lookup.
+QUERY_CACHE_BYTES = int(os.environ.get("NSF_QUERY_CACHE_BYTES", str(32 * 1024 * 1024)))
 
-    # Add ODU back to the list to ensure it's always plotted
-    selected_universities.append(odu_display_name)
+def session_query_cache():
+    if "query_cache" not in st.session_state:
+        st.session_state["query_cache"] = QueryCache(QUERY_CACHE_BYTES)
+    return st.session_state["query_cache"]
 
-    # Button to reset and show all universities
-    if st.button("Show All Universities"):
-        selected_universities = available_universities + [odu_display_name]
+def cached_query(key, index, compute):
+    sheet_name, version = index.key if index.key is not None else (None, None)
+    return session_query_cache().get((sheet_name,) + key, version, compute)
+
+# Figures already built, keyed by sheet, data version and selection; most recently used last.
+# A rerun with an unchanged selection reuses the figure instead of filtering and building again.
+FIGURE_CACHE_SIZE = 64
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+# Above this many plotted universities the macro view switches to WebGL (Scattergl) traces
+WEBGL_UNIVERSITY_THRESHOLD = int(os.environ.get("NSF_WEBGL_THRESHOLD", "50"))
+
+def cached_figure(key, build):
+    with _figure_cache_lock:
+        if key in _figure_cache:
+            _figure_cache.move_to_end(key)
+            return _figure_cache[key]
+    with stage("figure build", view=key[0]):
+        fig = build()
+    with _figure_cache_lock:
+        _figure_cache[key] = fig
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    return fig
+
+def build_macro_figure(filtered_data, selected_universities, selected_macro_category, y_label, webgl=False,
+                       focal_display_name=FOCAL_INSTITUTION.title(), band=None, band_label="Peer"):
+    # plotly is only imported once the first figure is drawn, not at app startup
+    import plotly.express as px
+    import plotly.graph_objects as go
 
     # Filter data based on selected universities
-    if selected_universities:
-        filtered_data = filtered_data[filtered_data['University_Display'].isin(selected_universities)]
-    else:
-        st.write("Please select at least one university to visualize.")
-        return
+    filtered_data = filtered_data[filtered_data['University'].isin(selected_universities)]
 
     # Create a line plot using a colorblind-friendly palette
     fig = px.line(
@@ -100,17 +98,30 @@ def plot_macro_level(selected_macro_category, data, y_label):
         color='University_Display',
         title=f"{y_label} for {selected_macro_category}",
         labels={'University_Display': ''},
-        color_discrete_sequence=px.colors.sequential.Viridis  # Using Viridis color palette
+        color_discrete_sequence=px.colors.sequential.Viridis,  # Using Viridis color palette
+        render_mode='webgl' if webgl else 'svg'
     )
 
-    # Highlight Old Dominion U with a distinct color
+    # Highlight the focal institution with a distinct color
     max_value = filtered_data['Value'].max()
     for trace in fig.data:
-        if trace.name == 'Old Dominion U':
-            trace.line = dict(color='rgba(255, 127, 14, 1)', width=6)  # Bright orange and thicker line for ODU
+        if trace.name == focal_display_name:
+            trace.line = dict(color='rgba(255, 127, 14, 1)', width=6)  # Bright orange and thicker line for the focal institution
         else:
             trace.line = dict(dash='dash', width=2.5, color=trace.line.color.replace('0.8', '0.5'))  # Slightly transparent for others
 
+    # Interquartile band and median of the peers, drawn behind the university lines
+    if band is not None and not band.empty:
+        years = band['Year'].tolist()
+        fig.add_traces([
+            go.Scatter(x=years, y=band['Q3'], mode='lines', line=dict(width=0), hoverinfo='skip', showlegend=False),
+            go.Scatter(x=years, y=band['Q1'], mode='lines', line=dict(width=0), fill='tonexty',
+                       fillcolor='rgba(150, 150, 150, 0.25)', name=f'{band_label} interquartile range'),
+            go.Scatter(x=years, y=band['Median'], mode='lines', line=dict(color='gray', width=3, dash='dot'), name=f'{band_label} median'),
+        ])
+        fig.data = fig.data[-3:] + fig.data[:-3]
+        max_value = max(max_value, band['Q3'].max())
+
     # Update layout for better readability and adjust legend positioning
     fig.update_layout(
         title={'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'},
@@ -128,25 +139,182 @@ def plot_macro_level(selected_macro_category, data, y_label):
         yaxis=dict(range=[0, max_value * 1.1])  # Dynamically adjust y-axis based on the maximum value
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 
-def plot_micro_level_multiple_subcategories(selected_macro_category, selected_university, comparison_university, data, y_label, subcategories):
-    # Filter data for selected categories and universities (always including ODU)
-    filtered_data = data[
-        (data['Category'].isin(subcategories)) &
-        (data['University'].isin([selected_university.lower(), comparison_university.lower()]))
-    ]
+# Universities preselected in the macro view (NSF_TOP_N): the top N of the category over every
+# year loaded, ranked by its latest year whatever year window is shown
+TOP_N_UNIVERSITIES = int(os.environ.get("NSF_TOP_N", "10"))
 
-    # Check if there is data to plot
+def top_universities(filtered_data, n, exclude=None):
+    latest = filtered_data[filtered_data['Year'] == filtered_data['Year'].max()]
+    totals = latest.groupby('University', observed=True)['Value'].sum(min_count=1).drop(exclude, errors='ignore')
+    return [str(university) for university in totals.nlargest(n).index]
+
+# Median and quartiles by year over the universities in `rows`
+def band_rows(rows):
+    per_university = rows.groupby(['University', 'Year'], observed=True)['Value'].sum(min_count=1)
+    quartiles = per_university.groupby(level='Year').quantile([0.25, 0.5, 0.75]).unstack()
+    return quartiles.set_axis(['Q1', 'Median', 'Q3'], axis=1).reset_index()
+
+# Rows of one macro category, with the registry's display name of each university.
+# Mapping the categorical column maps each category once, not each row.
+def macro_rows(selected_macro_category, index, registry):
+    filtered_data = index.category(selected_macro_category)
     if filtered_data.empty:
-        st.write("No data available for the selected options.")
+        return filtered_data
+    return filtered_data.assign(University_Display=filtered_data['University'].map(registry.display))
+
+
+# Registry standing in for the dataset's when a caller has none: display names fall back to
+# the title-cased university key
+def default_registry(registry):
+    return registry if registry is not None else InstitutionRegistry(())
+
+
+def plot_macro_level(selected_macro_category, index, y_label, webgl=None, focal=FOCAL_INSTITUTION, aggregates=None, registry=None):
+    if aggregates is not None:
+        focal = aggregates.focal
+    registry = default_registry(registry)
+
+    # Rows come out of the index already sorted by university and year
+    with stage("filter", view="macro") as record:
+        filtered_data = cached_query(('macro', selected_macro_category), index, lambda: macro_rows(selected_macro_category, index, registry))
+        record["rows"] = len(filtered_data)
+    if filtered_data.empty:
+        st.write(f"No data available for the category '{selected_macro_category}'.")
+        return
+
+    # The universities offered and preselected come from every year of the category, so moving
+    # the year window leaves the selection alone
+    category_rows = filtered_data
+    default_universities = cached_query(('macro top', selected_macro_category, focal, TOP_N_UNIVERSITIES), index,
+                                        lambda: top_universities(category_rows, TOP_N_UNIVERSITIES, exclude=focal))
+
+    # Only the selected window of years is filtered, plotted and sent to the browser
+    years = filtered_data['Year'].unique()
+    first_year, last_year = int(years.min()), int(years.max())
+    if first_year < last_year:
+        first_year, last_year = st.slider("Years:", min_value=first_year, max_value=last_year, value=(first_year, last_year))
+        filtered_data = cached_query(('macro window', selected_macro_category, first_year, last_year), index,
+                                     lambda: filtered_data[filtered_data['Year'].between(first_year, last_year)])
+
+    # Ensure the focal institution is always included and cannot be removed. Options are
+    # university keys, shown by their registry names.
+    focal_display_name = registry.display(focal)
+    available_universities = [str(university) for university in category_rows['University'].unique()]
+    if focal in available_universities:
+        available_universities.remove(focal)
+
+    # Multiselect option for universities with the focal institution always included,
+    # preselecting the largest ones so the default chart stays small however many peers there are.
+    # The key includes the focal institution, which is not an option, so switching it starts a
+    # fresh selection rather than keeping the new focal in the stored one.
+    selected_universities = st.multiselect(
+        f"Select universities to visualize ({focal_display_name} is always included):",
+        options=available_universities,
+        default=default_universities,
+        format_func=registry.display,
+        key=f"macro_universities_{selected_macro_category}_{focal}"
+    )
+
+    # Add the focal institution back to the list to ensure it's always plotted
+    selected_universities.append(focal)
+
+    # Button to reset and show all universities
+    if st.button("Show All Universities"):
+        selected_universities = available_universities + [focal]
+
+    # Peers can be summarized as a median and interquartile band: all of them from the loader's
+    # precomputed aggregates, or the ones not selected, collapsed into a single band
+    summaries = ["None", "Peers not selected"] + (["All peers"] if aggregates is not None else [])
+    summary = st.radio("Peer band (median and interquartile range):", summaries, horizontal=True)
+    band, band_label = None, "Peer"
+    if summary == "All peers":
+        band = aggregates.band(selected_macro_category)
+        band = band[band['Year'].between(first_year, last_year)]
+    elif summary == "Peers not selected":
+        others = frozenset(available_universities) - frozenset(selected_universities)
+        if others:
+            band = cached_query(('macro band', selected_macro_category, first_year, last_year, others), index,
+                                lambda: band_rows(filtered_data[filtered_data['University'].isin(others)]))
+            band_label = f"Other {len(others)} peers"
+
+    if not selected_universities:
+        st.write("Please select at least one university to visualize.")
         return
 
-    # Standardize university names for display
-    filtered_data['University'] = filtered_data['University'].str.strip().str.lower()
-    university_display_names = {u: u.title() for u in filtered_data['University'].unique()}
-    filtered_data['University_Display'] = filtered_data['University'].map(university_display_names)
+    # WebGL traces keep large peer sets responsive; values are already float32 and are
+    # sent to the browser as typed arrays
+    if webgl is None:
+        webgl = len(selected_universities) > WEBGL_UNIVERSITY_THRESHOLD
+
+    key = ('macro', index.key, selected_macro_category, y_label, frozenset(selected_universities), webgl, focal,
+           first_year, last_year, summary)
+    fig = cached_figure(key, lambda: build_macro_figure(filtered_data, selected_universities, selected_macro_category, y_label, webgl,
+                                                        focal_display_name, band, band_label))
+    with stage("serialize", rows=len(fig.data), view="macro"):
+        st.plotly_chart(fig, use_container_width=True)
+
+    if aggregates is not None:
+        show_rankings(aggregates, selected_macro_category, registry)
+    return selected_universities, (first_year, last_year)
+
+
+# Rank of every university in one category by year, with the focal institution's percentile
+def show_rankings(aggregates, category, registry=None):
+    registry = default_registry(registry)
+    with st.expander("Rankings"):
+        focal_rows = aggregates.focal_rows(category)
+        if not focal_rows.empty:
+            latest = focal_rows.iloc[-1]
+            st.write(f"{registry.display(aggregates.focal)} ranks {int(latest['Rank'])} in {int(latest['Year'])} "
+                     f"(percentile {latest['Percentile']:.0f}).")
+        table = aggregates.rank_table(category)
+        if table.empty:
+            st.write("No rankings available for this category.")
+            return
+        table.index = [registry.display(str(u)) for u in table.index]
+        st.dataframe(table.astype('Int64'), use_container_width=True)
+
+
+# Rows of the selected subcategories for the selected universities, with the registry's
+# display name of each university
+def micro_rows(universities, index, subcategories, registry):
+    filtered_data = index.select(subcategories, universities)
+    if filtered_data.empty:
+        return filtered_data
+    filtered_data = filtered_data.assign(
+        University=filtered_data['University'].astype(str),
+        Category=filtered_data['Category'].astype(str),
+    )
+    filtered_data['University_Display'] = filtered_data['University'].map(registry.display)
+    return filtered_data
+
+
+def build_micro_figure(selected_macro_category, universities, index, y_label, subcategories, analytics=None, trend=None, registry=None):
+    registry = default_registry(registry)
+
+    # Look up the selected categories and universities (the focal institution first) in the index
+    with stage("filter", view="micro") as record:
+        query = ('micro', tuple(subcategories), tuple(sorted(universities)))
+        filtered_data = cached_query(query, index, lambda: micro_rows(universities, index, subcategories, registry))
+        record["rows"] = len(filtered_data)
+    if filtered_data.empty:
+        return None
+
+    import plotly.express as px
+    focal_display_name = registry.display(universities[0])
+
+    # Fitted trend and forecast of every plotted series, drawn with its own dash style
+    plot_data = filtered_data
+    line_dash = None
+    if analytics is not None and trend is not None:
+        trend_rows = analytics.fitted_rows(trend, universities, subcategories)
+        if not trend_rows.empty:
+            trend_rows = trend_rows.assign(University_Display=trend_rows['University'].map(registry.display), Line=f"{trend} trend")
+            plot_data = pd.concat([filtered_data.assign(Line='Observed'), trend_rows], ignore_index=True)
+            line_dash = 'Line'
 
     # Adjust the facet wrap based on the number of selected subcategories
     num_subcategories = len(subcategories)
@@ -154,26 +322,30 @@ def plot_micro_level_multiple_subcategories(selected_macro_category, selected_un
 
     # Create the plot using a colorblind-friendly palette
     fig = px.line(
-        filtered_data,
+        plot_data,
         x='Year',
         y='Value',
         color='University_Display',
+        line_dash=line_dash,
         facet_col='Category',
         facet_col_wrap=facet_col_wrap,
         height=400 if num_subcategories <= 2 else 800,  # Adjust height based on number of subcategories
         title=f"Comparison of Selected Subcategories under {selected_macro_category}",
         labels={'Value': y_label, 'Year': 'Year'},
         color_discrete_map={
-            'Old Dominion U': 'rgba(255, 127, 14, 1)',  # Bright orange for ODU
-            'Notre Dame U': 'rgba(128, 177, 211, 1)'    # Lighter blue for better contrast
+            focal_display_name: 'rgba(255, 127, 14, 1)',  # Bright orange for the focal institution
+            registry.display('notre dame u'): 'rgba(128, 177, 211, 1)'    # Lighter blue for better contrast
         }
     )
 
-    # Highlight Old Dominion U with a distinct color
-    max_value = filtered_data['Value'].max()
+    # Highlight the focal institution with a distinct color
+    max_value = plot_data['Value'].max()
     for trace in fig.data:
-        if trace.name == 'Old Dominion U':
-            trace.line = dict(color='rgba(255, 127, 14, 1)', width=6)  # Bright orange and thicker line for ODU
+        university_name, _, line = trace.name.partition(', ')
+        if line and line != 'Observed':
+            trace.line = dict(dash='dot', width=2, color=trace.line.color)  # Trend lines keep their university's color
+        elif university_name == focal_display_name:
+            trace.line = dict(color='rgba(255, 127, 14, 1)', width=6)  # Bright orange and thicker line for the focal institution
         else:
             trace.line = dict(dash='dash', width=2.5, color=trace.line.color.replace('0.8', '0.7'))  # Adjust color for better contrast
 
@@ -195,4 +367,134 @@ def plot_micro_level_multiple_subcategories(selected_macro_category, selected_un
         font=dict(color="white")  # Ensure the font contrasts well against the dark background
     )
 
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    return fig
+
+
+def plot_micro_level_multiple_subcategories(selected_macro_category, selected_university, comparison_university, index, y_label, subcategories,
+                                            analytics=None, registry=None):
+    registry = default_registry(registry)
+    universities = [selected_university, comparison_university]
+
+    # Trends are fitted for every series once per data version (see analytics.py); drawing
+    # one is a lookup
+    trend = None
+    if analytics is not None:
+        choice = st.selectbox("Trend and forecast overlay:", ["None"] + TREND_METHODS)
+        trend = None if choice == "None" else choice
+
+    key = ('micro', index.key, selected_macro_category, y_label, tuple(universities), tuple(subcategories), trend)
+    fig = cached_figure(key, lambda: build_micro_figure(selected_macro_category, universities, index, y_label, subcategories, analytics, trend,
+                                                        registry))
+
+    # Check if there is data to plot
+    if fig is None:
+        st.write("No data available for the selected options.")
+        return
+
+    with stage("serialize", rows=len(fig.data), view="micro"):
+        st.plotly_chart(fig, use_container_width=True)
+
+    if analytics is not None:
+        with st.expander("Growth and forecasts"):
+            table = analytics.table(universities, subcategories, registry.display)
+            if table.empty:
+                st.write("No series to summarize.")
+            else:
+                st.dataframe(table.round(2), use_container_width=True, hide_index=True)
+
+
+# Matches offered by the type-ahead institution pickers
+SEARCH_RESULTS = int(os.environ.get("NSF_SEARCH_RESULTS", "20"))
+
+# Type-ahead picker over the registry: the search box narrows the choice to the best matches
+# for what has been typed (names, name words, aliases, or fragments with typos), so the
+# selectbox never lists every institution. Without a search the `suggested` universities come
+# first. Returns the picked university key, or None when nothing matches.
+def institution_picker(label, registry, universities, key, suggested=()):
+    candidates = {registry.id_for_key(university) for university in universities} - {None}
+    query = st.text_input("Search institutions:", key=f"{key}_search", placeholder="Part of a name or an alias, e.g. dayton")
+    if query:
+        options = registry.search(query, SEARCH_RESULTS, within=candidates)
+    else:
+        first = [registry.id_for_key(university) for university in suggested if registry.id_for_key(university) in candidates]
+        options = (first + sorted(candidates - set(first), key=registry.name))[:SEARCH_RESULTS]
+    if not options:
+        return None
+    return registry.key(st.selectbox(label, options, format_func=registry.name, key=key))
+
+
+# Nearest-peer index over every sheet, built from the cubes of the per-page datasets (the
+# same ones each page loads, so no sheet is held twice). When any of them moves to a new data
+# version the previous index is updated, recomputing only the institutions that changed.
+_similarity = {"versions": None, "index": None}
+_similarity_lock = threading.Lock()
+
+def load_similarity():
+    datasets = {sheet_name: load_dataset((sheet_name,)) for sheet_name in SIMILARITY_FEATURES}
+    versions = tuple(dataset.version for dataset in datasets.values())
+    with _similarity_lock:
+        if _similarity["versions"] != versions:
+            cubes = {sheet_name: dataset.cube(sheet_name) for sheet_name, dataset in datasets.items()}
+            universities, names, features = similarity_features(cubes, SIMILARITY_FEATURES)
+            with stage("similarity index", rows=len(universities)) as record:
+                _similarity["index"] = SimilarityIndex(universities, names, features, previous=_similarity["index"])
+                record["recomputed"] = _similarity["index"].recomputed
+            _similarity["versions"] = versions
+        return _similarity["index"]
+
+# Institutions most similar to `university` among `universities`, by enrollment by field,
+# support mix, postdoc counts and growth across every sheet (see similarity.py), listed in an
+# expander. Returns their keys, nearest first.
+def show_similar_institutions(university, universities, registry):
+    similarity = load_similarity()
+    with stage("nearest peers"):
+        nearest = similarity.nearest(university, SIMILAR_PEERS, within=universities)
+    with st.expander(f"Institutions most similar to {registry.display(university)}"):
+        if not nearest:
+            st.write("No similarity data available for this institution.")
+        else:
+            st.dataframe(pd.DataFrame({'Institution': [registry.display(peer) for peer, _ in nearest],
+                                       'Distance': [round(distance, 3) for _, distance in nearest]}),
+                         use_container_width=True, hide_index=True)
+    return [peer for peer, _ in nearest]
+
+
+# Export files are written here, one directory per data version
+EXPORT_DIR = os.path.join(".cache", "exports")
+
+# Download of the rows behind the current view (within its window of years, if any), or of the
+# whole sheet across all universities.
+# The file is streamed from the sheet's Arrow table when the button is clicked (on a separate
+# thread) and reused by later downloads of the same selection.
+def show_export(dataset, sheet_name, categories, universities, years=None):
+    with st.expander("Export data"):
+        scope = st.radio("Rows to export:", ["Current view", "Whole sheet"], horizontal=True, key="export_scope")
+        fmt = st.selectbox("Format:", list(EXPORT_FORMATS), key="export_format")
+        if scope == "Whole sheet":
+            parts, years = [(sheet_name, None)], None
+        else:
+            index = dataset.indexes[sheet_name]
+            parts = [(category, index.ranges([category], universities)) for category in categories]
+        extension, mime = EXPORT_FORMATS[fmt]
+        version = dataset.version
+
+        def export_file():
+            path = cached_export(EXPORT_DIR, version, sheet_name, dataset.table(sheet_name), parts, fmt, years)
+            with open(path, "rb") as f:
+                return f.read()
+
+        file_name = f"{sheet_name.replace(' ', '-')}{'' if scope == 'Whole sheet' else '-selection'}.{extension}"
+        st.download_button("Download", data=export_file, file_name=file_name, mime=mime, key="export_download")
+
+
+# Stage timings of this rerun: one JSON log line always, and a sidebar table when debugging
+# is enabled with ?debug=1 or NSF_DEBUG=1
+def report_run_timings():
+    run = finish_run()
+    log_run(run)
+    if os.environ.get("NSF_DEBUG") == "1" or st.query_params.get("debug") == "1":
+        with st.sidebar.expander("Debug: stage timings", expanded=False):
+            st.write(f"Rerun took {run['seconds']:.3f} s")
+            st.write("Query cache:", session_query_cache().stats())
+            if run['stages']:
+                st.dataframe(pd.DataFrame(run['stages']), use_container_width=True)